@@ -0,0 +1,258 @@
+"""Synthetic inputs for the benchmarks, generated offline from a seed.
+
+Every builder is deterministic: the same scale and seed give byte-identical
+trees, PDFs and calendars (the ffmpeg clip depends on the ffmpeg build), so
+numbers from different runs and commits are comparable. Fixtures are built
+once per scale and reused until the scale or FIXTURES_VERSION changes.
+"""
+import datetime
+import gzip
+import json
+import os
+import random
+import shutil
+import subprocess
+
+
+FIXTURES_VERSION = 1
+
+DEFAULT_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                           'utility-scripts', 'benchmark-fixtures')
+
+SCALES = {
+    'quick': {'tree_mb': 8, 'pdfs': 12, 'pdf_pages': 5, 'events': 500, 'clip_seconds': 3},
+    'full': {'tree_mb': 64, 'pdfs': 60, 'pdf_pages': 20, 'events': 5000, 'clip_seconds': 10},
+}
+
+# Events are placed around this date and the benchmarks export the year
+# after it, so the number of occurrences doesn't depend on today's date.
+ICS_ANCHOR = datetime.datetime(2025, 1, 1)
+
+STATES = ('Abia', 'Kano', 'Lagos', 'Oyo')
+
+_WORDS = ('meeting schedule contact office invoice report project budget review '
+          'quarter delivery customer account support request update summary '
+          'the of and to in for with on at by from is are was').split()
+
+
+def _random_bytes(rng, size):
+    return rng.getrandbits(8 * size).to_bytes(size, 'little') if size else b''
+
+
+def _text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size].encode('ascii')
+
+
+def _gzipped(rng, size):
+    data = b''
+    while len(data) < size:
+        data += gzip.compress(_text(rng, max(size, 65536)), mtime=0)
+    return data[:size]
+
+
+def make_tree(path, total_mb, seed=0):
+    """A directory tree of mixed compressibility for the zipper.
+
+    A quarter of the bytes each: prose (deflates ~3x), random bytes (not at
+    all), gzip files (already compressed) and long runs of a repeated record
+    (deflates ~100x), spread over nested folders with many small files and
+    a few large ones.
+
+    returns -> int: bytes written.
+    """
+    rng = random.Random(seed)
+    kinds = {
+        'txt': lambda size: _text(rng, size),
+        'bin': lambda size: _random_bytes(rng, size),
+        'gz': lambda size: _gzipped(rng, size),
+        'log': lambda size: (b'2025-01-01 00:00:00 INFO request served in 12ms\n' * (size // 48 + 1))[:size],
+    }
+    budget = total_mb * 1024 * 1024 // len(kinds)
+    written = 0
+    for kind, make in kinds.items():
+        remaining = budget
+        index = 0
+        while remaining > 0:
+            # mostly small files, with the odd large one
+            size = min(remaining, rng.choice((4096, 16384, 65536, 262144, 2 * 1024 * 1024)))
+            folder = os.path.join(path, kind, f'group{index % 5}', f'sub{index % 3}')
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f'file{index:04d}.{kind}'), 'wb') as f:
+                f.write(make(size))
+            remaining -= size
+            written += size
+            index += 1
+    return written
+
+
+def _pdf_string(text):
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one Helvetica text line per item of each page.
+
+    :param pages: A list of pages, each a list of text lines.
+    """
+    pages = list(pages)
+    font = 3 + 2 * len(pages)
+    objects = {
+        1: '<< /Type /Catalog /Pages 2 0 R >>',
+        2: '<< /Type /Pages /Kids [{}] /Count {} >>'.format(
+            ' '.join(f'{3 + 2 * i} 0 R' for i in range(len(pages))), len(pages)),
+        font: '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    }
+    for i, lines in enumerate(pages):
+        content = 'BT /F1 10 Tf 12 TL 50 750 Td ' + ' T* '.join(f'{_pdf_string(line)} Tj' for line in lines) + ' ET'
+        objects[3 + 2 * i] = (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                              f'/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>')
+        objects[4 + 2 * i] = f'<< /Length {len(content)} >>\nstream\n{content}\nendstream'
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f'{number} 0 obj\n{objects[number]}\nendobj\n'.encode('latin-1')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    for number in sorted(objects):
+        out += f'{offsets[number]:010d} 00000 n \n'.encode('latin-1')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def make_pdfs(path, count, pages, seed=0):
+    """State folders of multi-page PDFs with contacts in their text, laid
+    out as pdf_extractor expects (path/<state>/<file>.pdf).
+
+    Each page holds 40 lines of filler with a few phone numbers and email
+    addresses in between.
+
+    returns -> int: pages written.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        folder = os.path.join(path, STATES[i % len(STATES)])
+        os.makedirs(folder, exist_ok=True)
+        document = []
+        for _ in range(pages):
+            lines = [_text(rng, 90).decode('ascii') for _ in range(40)]
+            for _ in range(rng.randint(1, 4)):
+                phone = f'0{rng.choice("789")}0-{rng.randint(100, 999)}-{rng.randint(10000, 99999)}'
+                email = f'{rng.choice(_WORDS[:20])}{rng.randint(1, 999)}@example{rng.randint(1, 9)}.com'
+                lines[rng.randrange(len(lines))] += f' call {phone} or mail {email}'
+            document.append(lines)
+        write_pdf(os.path.join(folder, f'doc{i:04d}.pdf'), document)
+    return count * pages
+
+
+def make_ics(path, events, seed=0):
+    """A calendar of `events` events around ICS_ANCHOR in a VTIMEZONE,
+    a third of them recurring (weekly with COUNT, daily with UNTIL) and
+    some with a moved occurrence (RECURRENCE-ID). Long lines are folded.
+    """
+    rng = random.Random(seed)
+
+    def fmt(dt):
+        return dt.strftime('%Y%m%dT%H%M%S')
+
+    out = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//utility-scripts//benchmark//EN',
+           'BEGIN:VTIMEZONE', 'TZID:Europe/Berlin',
+           'BEGIN:STANDARD', 'DTSTART:19701025T030000', 'TZOFFSETFROM:+0200', 'TZOFFSETTO:+0100',
+           'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU', 'END:STANDARD',
+           'BEGIN:DAYLIGHT', 'DTSTART:19700329T020000', 'TZOFFSETFROM:+0100', 'TZOFFSETTO:+0200',
+           'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU', 'END:DAYLIGHT',
+           'END:VTIMEZONE']
+    for i in range(events):
+        start = ICS_ANCHOR + datetime.timedelta(days=rng.randint(-2000, 500), hours=rng.randint(0, 23))
+        uid = f'event-{i}@benchmark'
+        out += ['BEGIN:VEVENT', f'UID:{uid}', f'SUMMARY:Event {i}', f'DTSTAMP:{fmt(ICS_ANCHOR)}Z',
+                f'DTSTART;TZID=Europe/Berlin:{fmt(start)}',
+                f'DTEND;TZID=Europe/Berlin:{fmt(start + datetime.timedelta(hours=1))}',
+                'DESCRIPTION:' + 'A long description that will be folded ' * 4,
+                f'LOCATION:Room {i % 7}']
+        kind = rng.random()
+        if kind < 0.3:
+            out.append(f'RRULE:FREQ=WEEKLY;COUNT={rng.randint(2, 200)}')
+        elif kind < 0.4:
+            until = start + datetime.timedelta(days=rng.randint(1, 900))
+            out.append(f'RRULE:FREQ=DAILY;UNTIL={fmt(until)}Z')
+        out += ['BEGIN:VALARM', 'ACTION:DISPLAY', 'TRIGGER:-PT15M', 'END:VALARM', 'END:VEVENT']
+        if kind < 0.1:
+            moved = start + datetime.timedelta(days=7)
+            out += ['BEGIN:VEVENT', f'UID:{uid}', f'RECURRENCE-ID;TZID=Europe/Berlin:{fmt(moved)}',
+                    f'SUMMARY:Moved {i}', f'DTSTAMP:{fmt(ICS_ANCHOR)}Z',
+                    f'DTSTART;TZID=Europe/Berlin:{fmt(moved + datetime.timedelta(hours=1))}',
+                    f'DTEND;TZID=Europe/Berlin:{fmt(moved + datetime.timedelta(hours=2))}',
+                    'END:VEVENT']
+    out.append('END:VCALENDAR')
+
+    def fold(line):
+        return '\r\n '.join([line[:75]] + [line[j:j + 74] for j in range(75, len(line), 74)])
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('\r\n'.join(fold(line) for line in out) + '\r\n')
+
+
+def make_clip(path, seconds):
+    """A 640x360 30 fps H.264/AAC clip of ffmpeg's testsrc2 pattern and a tone.
+
+    returns -> bool: False if ffmpeg isn't available.
+    """
+    if shutil.which('ffmpeg') is None:
+        return False
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+         '-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=30:duration={seconds}',
+         '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+         '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+         '-c:a', 'aac', '-b:a', '128k', '-shortest', path],
+        check=True,
+    )
+    return True
+
+
+def build(scale='quick', root=None, seed=0):
+    """Build (or reuse) the fixtures for a scale.
+
+    returns -> dict: 'tree', 'pdfs', 'ics' and 'clip' paths ('clip' is None
+               without ffmpeg), the scale's parameters under 'params' and
+               the amounts generated ('tree_bytes', 'pdf_count', 'pdf_pages').
+    """
+    params = SCALES[scale]
+    root = os.path.join(root or DEFAULT_DIR, scale)
+    manifest_path = os.path.join(root, 'manifest.json')
+    wanted = {'version': FIXTURES_VERSION, 'seed': seed, 'params': params}
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if {key: manifest.get(key) for key in wanted} == wanted \
+                and (manifest['clip'] or shutil.which('ffmpeg') is None):
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    print(f'Building {scale} fixtures in {root} ...')
+    paths = {name: os.path.join(root, name) for name in ('tree', 'pdfs', 'ics', 'clip')}
+    paths['ics'] += '.ics'
+    paths['clip'] += '.mkv'
+    manifest = dict(wanted, **paths)
+    manifest['tree_bytes'] = make_tree(paths['tree'], params['tree_mb'], seed)
+    manifest['pdf_pages'] = make_pdfs(paths['pdfs'], params['pdfs'], params['pdf_pages'], seed)
+    manifest['pdf_count'] = params['pdfs']
+    make_ics(paths['ics'], params['events'], seed)
+    if not make_clip(paths['clip'], params['clip_seconds']):
+        manifest['clip'] = None
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
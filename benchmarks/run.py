@@ -0,0 +1,354 @@
+"""Benchmark every tool's hot path on generated fixtures.
+
+    python -m benchmarks.run                         # all cases, quick scale
+    python -m benchmarks.run zip-serial ics-stream --scale full
+    python -m benchmarks.run --save-baseline         # record this machine's baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+Run from the repository root. Every case runs in a freshly spawned process,
+so peak RSS is its own and earlier cases leave nothing warm behind; the
+best of --repeat runs is kept. One more run under cProfile records the
+hot spots. Pool-based cases (zip-parallel, pdf-extract) only profile the
+parent process; their serial counterparts show where the workers spend
+their time.
+
+Results go to a JSON file. Against a baseline, any case whose time or
+peak RSS grew by more than --tolerance is flagged and the exit status is 1.
+"""
+import argparse
+import contextlib
+import cProfile
+import csv
+import datetime
+import glob
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import pstats
+import queue as queues
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+try:
+    from . import fixtures
+except ImportError:
+    import fixtures
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TOLERANCE = 0.15
+HOTSPOTS = 15
+
+# fixture: key of the fixtures manifest the case needs (skipped if it is None)
+# modules: imported before the clock starts, so import time isn't measured
+# prepare: optional callable(fixtures, workdir) run before the clock starts
+# run: callable(fixtures, workdir) -> amount of work done, in `unit`
+Case = namedtuple('Case', 'fixture unit modules prepare run')
+
+
+def _peak_rss_mb(children=False):
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def _zip(workers):
+    def run(paths, work):
+        from zipper import zip_directory
+        zip_directory(paths['tree'], os.path.join(work, 'tree.zip'), workers=workers)
+        return paths['tree_bytes'] / (1024 * 1024)
+    return run
+
+
+def _pdf_scan(paths, work):
+    from pdf_email_phone_extractor.extractor import extract_contacts
+    for pdf_file in sorted(glob.glob(os.path.join(paths['pdfs'], '*', '*.pdf'))):
+        extraction = extract_contacts(pdf_file)
+        if extraction.error:
+            raise RuntimeError(f'{pdf_file}: {extraction.error}')
+    return paths['pdf_pages']
+
+
+def _pdf_extract(paths, work):
+    from pdf_email_phone_extractor.extractor import pdf_extractor
+    pdf_extractor(paths['pdfs'] + os.sep, os.path.join(work, ''), keep_input=True)
+    return paths['pdf_pages']
+
+
+def _ics_window():
+    start = fixtures.ICS_ANCHOR - datetime.timedelta(days=1)
+    return start, start + datetime.timedelta(days=366)
+
+
+def _count_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+def _ics(stream=False, cached=False):
+    def run(paths, work):
+        from ics_to_xsls_converter.converter import ics_to_excel
+        start, end = _ics_window()
+        output = os.path.join(work, 'calendar.csv')
+        ics_to_excel(paths['ics'], output, stream=stream, start=start, end=end,
+                     cache_path=os.path.join(work, 'expansion.cache') if cached else None)
+        return _count_rows(output)
+    return run
+
+
+def _convert(paths, work):
+    from video_format_converter import convert_video
+    convert_video(paths['clip'], 'mp4', os.path.join(work, 'clip.mp4'))
+    return paths['params']['clip_seconds']
+
+
+def _compress(paths, work):
+    from mp4_lossless_compressor.compress_lossless import compress_video_to_size
+    seconds = paths['params']['clip_seconds']
+    # about 800 kbps
+    compress_video_to_size(paths['clip'], os.path.join(work, 'clip.mp4'),
+                           target_size_gb=seconds * 0.0001, on_progress=None)
+    return seconds
+
+
+def _complexity(paths, work):
+    from mp4_lossless_compressor.complexity import analyze_complexity
+    return analyze_complexity(paths['clip']).duration
+
+
+CASES = {
+    'zip-serial': Case('tree', 'MB', ('zipper',), None, _zip(None)),
+    'zip-parallel': Case('tree', 'MB', ('zipper',), None, _zip(0)),
+    'pdf-scan': Case('pdfs', 'pages', ('pdf_email_phone_extractor.extractor', 'PyPDF2'), None, _pdf_scan),
+    'pdf-extract': Case('pdfs', 'pages', ('pdf_email_phone_extractor.extractor', 'PyPDF2'), None, _pdf_extract),
+    'ics-full': Case('ics', 'rows', ('ics_to_xsls_converter.converter', 'icalendar', 'recurring_ical_events'),
+                     None, _ics()),
+    'ics-stream': Case('ics', 'rows', ('ics_to_xsls_converter.converter', 'icalendar', 'recurring_ical_events'),
+                       None, _ics(stream=True)),
+    # second run over an unchanged calendar: every event comes from the cache
+    'ics-cached': Case('ics', 'rows', ('ics_to_xsls_converter.converter', 'icalendar', 'recurring_ical_events'),
+                       _ics(cached=True), _ics(cached=True)),
+    'video-remux': Case('clip', 'video s', ('video_format_converter',), None, _convert),
+    'video-complexity': Case('clip', 'video s', ('mp4_lossless_compressor.complexity', 'numpy'),
+                             None, _complexity),
+    'video-compress': Case('clip', 'video s', ('mp4_lossless_compressor.compress_lossless', 'ffmpeg'),
+                           None, _compress),
+}
+
+
+def _hotspots(profiler, top):
+    stats = pstats.Stats(profiler)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        if filename.startswith(root):
+            filename = os.path.relpath(filename, root)
+        rows.append({'function': f'{filename}:{line}({function})', 'calls': calls,
+                     'tottime': round(tottime, 4), 'cumtime': round(cumtime, 4)})
+    rows.sort(key=lambda row: row['tottime'], reverse=True)
+    return rows[:top]
+
+
+def _run_case(name, paths, profile, top, queue):
+    case = CASES[name]
+    try:
+        for module in case.modules:
+            importlib.import_module(module)
+        with tempfile.TemporaryDirectory() as work, open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            if case.prepare is not None:
+                case.prepare(paths, work)
+            rss_before = _peak_rss_mb()
+            profiler = cProfile.Profile() if profile else None
+            started = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            amount = case.run(paths, work)
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - started
+        queue.put({
+            'seconds': seconds,
+            'amount': amount,
+            'peak_rss_mb': _peak_rss_mb(),
+            'rss_growth_mb': _peak_rss_mb() - rss_before if rss_before is not None else None,
+            # the largest waited-for child: pool workers, ffmpeg
+            'children_peak_rss_mb': _peak_rss_mb(children=True),
+            'hotspots': _hotspots(profiler, top) if profiler is not None else None,
+        })
+    except Exception as e:
+        queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def _spawn(name, paths, profile=False, top=HOTSPOTS):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(name, paths, profile, top, queue))
+    process.start()
+    try:
+        while True:
+            try:
+                return queue.get(timeout=1)
+            except queues.Empty:
+                if not process.is_alive():
+                    # it may have put its result just before exiting
+                    try:
+                        return queue.get(timeout=1)
+                    except queues.Empty:
+                        return {'error': f'case process exited with code {process.exitcode}'}
+    finally:
+        process.join()
+
+
+def run_benchmarks(names=None, scale='quick', repeat=3, profile=True, top=HOTSPOTS, fixtures_dir=None):
+    """Run the named cases (default: all) and collect their results.
+
+    returns -> dict: 'meta' (machine, Python, scale, commit) and 'cases',
+               name -> {'seconds' (best run), 'runs', 'throughput', 'unit',
+               'peak_rss_mb', 'rss_growth_mb', 'children_peak_rss_mb',
+               'hotspots'}, or {'skipped': reason} / {'error': message}.
+    """
+    paths = fixtures.build(scale, fixtures_dir)
+    results = {'meta': _meta(scale), 'cases': {}}
+    for name in names or CASES:
+        case = CASES[name]
+        if paths.get(case.fixture) is None:
+            results['cases'][name] = {'skipped': f'no {case.fixture} fixture (is ffmpeg installed?)'}
+            print(f'{name:<16}skipped')
+            continue
+        if case.fixture == 'clip' and shutil.which('ffmpeg') is None:
+            # the clip may come from a cached build on a machine that had ffmpeg
+            results['cases'][name] = {'skipped': 'ffmpeg is not installed'}
+            print(f'{name:<16}skipped')
+            continue
+        runs = [_spawn(name, paths) for _ in range(repeat)]
+        errors = [run['error'] for run in runs if 'error' in run]
+        if errors:
+            results['cases'][name] = {'error': errors[0]}
+            print(f'{name:<16}failed: {errors[0]}')
+            continue
+        best = min(runs, key=lambda run: run['seconds'])
+        result = {
+            'seconds': best['seconds'],
+            'runs': [run['seconds'] for run in runs],
+            'throughput': best['amount'] / best['seconds'],
+            'unit': f'{case.unit}/s',
+            'peak_rss_mb': max(run['peak_rss_mb'] or 0 for run in runs),
+            'rss_growth_mb': max(run['rss_growth_mb'] or 0 for run in runs),
+            'children_peak_rss_mb': max(run['children_peak_rss_mb'] or 0 for run in runs),
+            'hotspots': _spawn(name, paths, profile=True, top=top).get('hotspots') if profile else None,
+        }
+        results['cases'][name] = result
+        print(f"{name:<16}{result['seconds']:>9.3f}s{result['throughput']:>12.1f} {result['unit']:<10}"
+              f"{result['peak_rss_mb']:>8.1f} MB")
+    return results
+
+
+def _meta(scale):
+    commit = None
+    with contextlib.suppress(Exception):
+        import subprocess
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    return {
+        'scale': scale,
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Compare results with a baseline from the same scale.
+
+    returns -> list: (case, metric, baseline value, new value) for every
+               seconds or peak_rss_mb that grew by more than tolerance.
+    """
+    if baseline['meta']['scale'] != results['meta']['scale']:
+        raise ValueError(f"baseline is for scale {baseline['meta']['scale']!r}, "
+                         f"not {results['meta']['scale']!r}")
+    regressions = []
+    print(f"\n{'case':<16}{'seconds':>10}{'baseline':>10}{'change':>9}{'peak MB':>10}{'baseline':>10}{'change':>9}")
+    for name, result in results['cases'].items():
+        base = baseline['cases'].get(name)
+        if not base or 'seconds' not in result or 'seconds' not in base:
+            continue
+        line = f'{name:<16}'
+        for metric in ('seconds', 'peak_rss_mb'):
+            new, old = result[metric], base[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ' '
+            if change > tolerance:
+                regressions.append((name, metric, old, new))
+                flag = '!'
+            line += f'{new:>10.2f}{old:>10.2f}{change:>+8.0%}{flag}'
+        print(line)
+    baseline_machine = (baseline['meta'].get('platform'), baseline['meta'].get('cpus'))
+    if baseline_machine != (results['meta']['platform'], results['meta']['cpus']):
+        print('Note: the baseline was recorded on a different machine; timings may not be comparable.')
+    return regressions
+
+
+def _write_json(path, data):
+    partial = path + '.partial'
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(partial, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the utilities on generated fixtures")
+    parser.add_argument("cases", nargs="*", help=f"Cases to run: {', '.join(CASES)} (default: all)")
+    parser.add_argument("--scale", choices=list(fixtures.SCALES), default="quick",
+                        help="Fixture size (default: quick)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, best counts (default: 3)")
+    parser.add_argument("--no-profile", action="store_true", help="Skip the cProfile run")
+    parser.add_argument("--top", type=int, default=HOTSPOTS,
+                        help=f"Hot spots kept per case (default: {HOTSPOTS})")
+    parser.add_argument("--fixtures", help=f"Fixture directory (default: {fixtures.DEFAULT_DIR})")
+    parser.add_argument("-o", "--output", default="benchmark_results.json",
+                        help="Results file (default: benchmark_results.json)")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH,
+                        help=f"Compare with this results file (default: {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH,
+                        help="Also store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"Growth flagged as a regression (default: {TOLERANCE:.2f})")
+    args = parser.parse_args()
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    results = run_benchmarks(args.cases or None, args.scale, args.repeat, not args.no_profile,
+                             args.top, args.fixtures)
+    _write_json(args.output, results)
+    print(f'Results written to {args.output}')
+    if args.save_baseline:
+        _write_json(args.save_baseline, results)
+        print(f'Baseline saved to {args.save_baseline}')
+
+    failed = [name for name, result in results['cases'].items() if 'error' in result]
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, old, new in regressions:
+            print(f'REGRESSION {name}: {metric} {old:.2f} -> {new:.2f}')
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
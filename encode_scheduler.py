@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mp4_lossless_compressor.probe_cache import probe
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm', '.m4v', '.wmv', '.flv', '.ts', '.mts')
+
+
+def find_videos(inputs, extensions=VIDEO_EXTENSIONS):
+    """Expand a list of files and directories into the video files they hold.
+
+    Directories are searched recursively; files are taken as given.
+
+    returns -> list: absolute paths, without duplicates, in input order.
+    """
+    found = []
+    for item in inputs:
+        item = os.path.abspath(os.path.expanduser(item))
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(extensions))
+        else:
+            found.append(item)
+    return list(dict.fromkeys(found))
+
+
+def compress_job(size_gb, **options):
+    """A job runner that calls compress_video_to_size with the given options."""
+    def run(input_path, threads):
+        from mp4_lossless_compressor.compress_lossless import compress_video_to_size
+        # several jobs at once: one live progress line each would garble the console
+        return compress_video_to_size(input_path, target_size_gb=size_gb, threads=threads,
+                                      on_progress=None, **options)
+    return run
+
+
+def convert_job(output_format='mp4', force_reencode=False):
+    """A job runner that calls video_format_converter.convert_video."""
+    def run(input_path, threads):
+        from video_format_converter import convert_video
+        return convert_video(input_path, output_format, threads=threads,
+                             force_reencode=force_reencode)
+    return run
+
+
+class EncodeScheduler:
+    """Runs one encode per input file, several at a time, within a CPU budget.
+
+    Every job gets an explicit thread count (cpus // jobs, where jobs is
+    capped at the number of pending files), so the encodes running side by
+    side never ask for more threads than the budget. Jobs
+    are started longest first, by probed duration, so one long file doesn't
+    end up running alone at the end. The queue is saved to a JSON state file
+    after every change; run() on the same state file resumes, skipping jobs
+    that are already done.
+    """
+
+    def __init__(self, inputs, runner, state_path, cpus=None, jobs=None, retries=1):
+        self.runner = runner
+        self.state_path = state_path
+        self.cpus = cpus or os.cpu_count() or 1
+        self.jobs = max(1, min(jobs or 4, self.cpus))
+        self.threads = max(1, self.cpus // self.jobs)
+        self.retries = retries
+        self._lock = threading.Lock()
+        self.queue = self._load_state()
+        outputs = {job.get('output') for job in self.queue.values()}
+        for path in inputs:
+            # a re-scan of the same folder also finds what earlier runs wrote
+            if path not in self.queue and path not in outputs:
+                self.queue[path] = {'status': 'pending', 'attempts': 0}
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding='utf-8') as f:
+            queue = json.load(f)['jobs']
+        for job in queue.values():
+            if job['status'] == 'running':
+                # interrupted mid-encode last time
+                job['status'] = 'pending'
+        return queue
+
+    def _save_state(self):
+        partial = self.state_path + '.partial'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({'cpus': self.cpus, 'jobs': self.queue}, f, indent=2)
+        os.replace(partial, self.state_path)
+
+    def _update(self, path, **fields):
+        with self._lock:
+            self.queue[path].update(fields)
+            self._save_state()
+
+    def _probe_durations(self):
+        for path, job in self.queue.items():
+            if job['status'] == 'done' or 'duration' in job:
+                continue
+            try:
+                job['duration'] = float(probe(path)['format']['duration'])
+            except Exception as e:
+                job.update(status='failed', error=f'probe: {e}')
+        self._save_state()
+
+    def _run_job(self, path):
+        job = self.queue[path]
+        while True:
+            self._update(path, status='running', attempts=job['attempts'] + 1)
+            started = time.perf_counter()
+            try:
+                output = self.runner(path, self.threads)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                if job['attempts'] <= self.retries:
+                    print(f'Retrying {path} after error: {error}')
+                    continue
+                self._update(path, status='failed', error=error,
+                             seconds=time.perf_counter() - started)
+                return
+            self._update(path, status='done', output=output, error=None,
+                         seconds=time.perf_counter() - started)
+            return
+
+    def run(self):
+        """Run every pending job and return the summary (see summary()),
+        plus the 'jobs' run side by side and the 'threads' each had."""
+        already_done = {path for path, job in self.queue.items() if job['status'] == 'done'}
+        self._probe_durations()
+        pending = [path for path, job in self.queue.items()
+                   if job['status'] == 'pending'
+                   or (job['status'] == 'failed' and 'duration' in job)]
+        pending.sort(key=lambda path: self.queue[path]['duration'], reverse=True)
+        for path in pending:
+            self.queue[path].update(status='pending', attempts=0)
+
+        # fewer files than job slots: give the ones there are the whole budget
+        jobs = max(1, min(self.jobs, len(pending)))
+        self.threads = max(1, self.cpus // jobs)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(self._run_job, pending))
+        ran = [path for path in self.queue if path not in already_done]
+        return dict(self.summary(ran, time.perf_counter() - started), jobs=jobs, threads=self.threads)
+
+    def summary(self, paths, wall_seconds):
+        """Counts and throughput of a run over `paths`.
+
+        returns -> dict: done/failed counts, video_seconds encoded,
+                   wall_seconds and video_seconds_per_second.
+        """
+        done = [self.queue[path] for path in paths if self.queue[path]['status'] == 'done']
+        video_seconds = sum(job['duration'] for job in done)
+        return {
+            'done': len(done),
+            'failed': sum(1 for path in paths if self.queue[path]['status'] == 'failed'),
+            'video_seconds': video_seconds,
+            'wall_seconds': wall_seconds,
+            'video_seconds_per_second': video_seconds / wall_seconds if wall_seconds else 0.0,
+        }
+
+
+def print_summary(scheduler, summary):
+    print(f"\n{'file':<50}{'status':>8}{'video s':>10}{'encode s':>10}{'x realtime':>12}")
+    for path, job in sorted(scheduler.queue.items(), key=lambda item: -item[1].get('duration', 0)):
+        duration = job.get('duration', 0)
+        seconds = job.get('seconds') or 0
+        speed = f'{duration / seconds:.2f}' if seconds and job['status'] == 'done' else '-'
+        print(f"{os.path.basename(path)[:49]:<50}{job['status']:>8}{duration:>10.1f}{seconds:>10.1f}{speed:>12}")
+        if job['status'] == 'failed':
+            print(f"    {''.join((job.get('error') or '').strip().splitlines()[-1:])}")
+    print(f"\n{summary['done']} done, {summary['failed']} failed on {summary['jobs']} jobs x "
+          f"{summary['threads']} threads: {summary['video_seconds']:.0f}s of video in "
+          f"{summary['wall_seconds']:.0f}s ({summary['video_seconds_per_second']:.2f} s of video per s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many video encodes side by side within a CPU budget")
+    parser.add_argument("inputs", nargs="+", help="Video files and/or directories to search")
+    parser.add_argument("--mode", choices=("compress", "convert"), default="compress",
+                        help="compress_lossless to a target size, or video_format_converter (default: compress)")
+    parser.add_argument("-s", "--size", type=float, default=1.0,
+                        help="compress: target file size in GB (default: 1.0)")
+    parser.add_argument("--hevc", action="store_true", help="compress: use H.265/HEVC")
+    parser.add_argument("-f", "--format", default="mp4", help="convert: output format (default: mp4)")
+    parser.add_argument("--force-reencode", action="store_true",
+                        help="convert: re-encode even if the streams could be copied")
+    parser.add_argument("--cpus", type=int, help="CPU threads to use in total (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                        help="Encodes to run at the same time (default: 4)")
+    parser.add_argument("--retries", type=int, default=1, help="Retries per failed job (default: 1)")
+    parser.add_argument("--state", default="encode_queue.json",
+                        help="Queue state file; run again with it to resume (default: encode_queue.json)")
+    args = parser.parse_args()
+
+    if args.mode == "compress":
+        runner = compress_job(args.size, use_hevc=args.hevc)
+    else:
+        runner = convert_job(args.format, force_reencode=args.force_reencode)
+
+    scheduler = EncodeScheduler(find_videos(args.inputs), runner, args.state,
+                                cpus=args.cpus, jobs=args.jobs, retries=args.retries)
+    summary = scheduler.run()
+    print_summary(scheduler, summary)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,18 @@
+import argparse
+import glob
+import os
 import sys
-import pandas as pd
-from icalendar import Calendar
-import recurring_ical_events
+import time
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+from collections import Counter
+
+try:
+    from .expansion_cache import ExpansionCache
+    from .writers import COLUMNS, FORMATS, open_writer, output_format
+except ImportError:
+    from expansion_cache import ExpansionCache
+    from writers import COLUMNS, FORMATS, open_writer, output_format
 
 
 def process_filenames(filenames):
@@ -28,67 +38,563 @@ def process_filenames(filenames):
 
 
 def remove_timezone(dt):
-    '''Remove timezone information from a datetime object.'''
+    '''Remove timezone information from a datetime object.
+
+    Dates (all-day events) have none and are returned as they are.'''
+    if not isinstance(dt, datetime.datetime):
+        return dt
     return dt.replace(tzinfo=None)
 
-def ics_to_excel(ics_file_path, excel_file_path):
-    '''Converts iCalender file to spreadsheet'''
+def event_row(event):
+    '''Turns one expanded event occurrence into a row tuple in COLUMNS order.'''
+    return (
+        str(event.get('summary')),
+        remove_timezone(event.get('dtstart').dt),
+        remove_timezone(event.get('dtend').dt),
+        str(event.get('description')),
+        str(event.get('location')),
+    )
+
+
+def unfolded_lines(file):
+    '''Yields the content lines of an iCalendar file with folded lines joined.
+
+    Reads `file` (opened in binary mode) one physical line at a time.
+    '''
+    current = None
+    for raw in file:
+        line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _value(line, name):
+    '''Value of an unfolded line if it is a `name` property, else None.'''
+    if line.upper().startswith((name + ':', name + ';')):
+        return line.split(':', 1)[1].strip()
+    return None
+
+
+def _property(lines, name):
+    '''Value of the first `name` property in a list of unfolded lines.'''
+    for line in lines:
+        value = _value(line, name)
+        if value is not None:
+            return value
+    return None
+
+
+def _date_key(value):
+    '''Leading YYYYMMDD of an iCalendar date/date-time value, as a date.'''
+    try:
+        return datetime.date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except (TypeError, ValueError):
+        return None
+
+
+def _may_overlap(lines, start, end):
+    '''Cheap check on the raw lines of one event group whether any
+    occurrence can fall between start and end. Errs on the side of True.'''
+    # one day of slack either side covers any UTC offset
+    first_day = start.date() - datetime.timedelta(days=1)
+    last_day = end.date() + datetime.timedelta(days=1)
+
+    dtstart = _date_key(_property(lines, 'DTSTART'))
+    recurring = _property(lines, 'RRULE') or _property(lines, 'RDATE') \
+        or _property(lines, 'RECURRENCE-ID')
+    if dtstart is not None and dtstart > last_day and not _property(lines, 'RECURRENCE-ID'):
+        return False
+    if recurring:
+        rrule = _property(lines, 'RRULE') or ''
+        for part in rrule.split(';'):
+            if part.upper().startswith('UNTIL='):
+                until = _date_key(part[6:])
+                if until is not None and until < first_day and not _property(lines, 'RDATE') \
+                        and not _property(lines, 'RECURRENCE-ID'):
+                    return False
+        return True
+    dtend = _date_key(_property(lines, 'DTEND'))
+    if dtend is not None and dtend < first_day:
+        return False
+    return True
+
+
+def _scan_calendar(ics_file_path):
+    '''First pass over a calendar: calendar level properties, VTIMEZONE
+    blocks and how many VEVENTs share each UID.'''
+    header = []
+    timezones = []
+    uid_counts = Counter()
+    stack = []
+    block = None
+    with open(ics_file_path, 'rb') as file:
+        for line in unfolded_lines(file):
+            upper = line.upper()
+            if upper.startswith('BEGIN:'):
+                stack.append(upper[6:])
+                if stack[-1] == 'VTIMEZONE' and len(stack) == 2:
+                    block = []
+            if block is not None:
+                block.append(line)
+            elif len(stack) == 1 and not upper.startswith(('BEGIN:', 'END:')):
+                header.append(line)
+            elif len(stack) == 2 and stack[-1] == 'VEVENT' and _value(line, 'UID') is not None:
+                uid_counts[_value(line, 'UID')] += 1
+            if upper.startswith('END:') and stack:
+                if stack.pop() == 'VTIMEZONE' and len(stack) == 1:
+                    timezones.append(block)
+                    block = None
+    return header, timezones, uid_counts
+
+
+def _event_groups(ics_file_path, uid_counts):
+    '''Yields each VEVENT of a calendar as a list of unfolded lines, grouped
+    with the other VEVENTs (modified occurrences) sharing its UID.'''
+    pending = {}
+    depth = 0
+    event = uid = None
+    with open(ics_file_path, 'rb') as file:
+        for line in unfolded_lines(file):
+            upper = line.upper()
+            if upper.startswith('BEGIN:'):
+                depth += 1
+                if depth == 2 and upper == 'BEGIN:VEVENT':
+                    event = []
+            if event is not None:
+                event.append(line)
+                # the event's own UID, as _scan_calendar counted it (not a VALARM's)
+                if depth == 2 and uid is None:
+                    uid = _value(line, 'UID')
+            if upper.startswith('END:'):
+                depth -= 1
+                if depth == 1 and event is not None:
+                    if uid_counts[uid] > 1:
+                        # wait for the master and all of its modified occurrences
+                        group = pending.setdefault(uid, [])
+                        group.append(event)
+                        if len(group) == uid_counts[uid]:
+                            yield pending.pop(uid)
+                    else:
+                        yield [event]
+                    event = uid = None
+    yield from pending.values()
+
+
+def _expand_group(prefix, events, start, end, timings):
+    '''Parses one event group on its own and expands it between start and end.'''
+    from icalendar import Calendar
+    import recurring_ical_events
+    lines = [line for event in events for line in event]
+    started = time.perf_counter()
+    calendar = Calendar.from_ical('\r\n'.join(prefix + lines + ['END:VCALENDAR']) + '\r\n')
+    parsed = time.perf_counter()
+    occurrences = recurring_ical_events.of(calendar).between(start, end)
+    timings['parse'] += parsed - started
+    timings['expand'] += time.perf_counter() - parsed
+    return occurrences
+
+
+def _calendar_prefix(ics_file_path, timings):
+    '''First pass of the streaming parser: the lines every event group is
+    parsed with, and the number of VEVENTs per UID.'''
+    timings.setdefault('parse', 0.0)
+    timings.setdefault('expand', 0.0)
+    started = time.perf_counter()
+    header, timezones, uid_counts = _scan_calendar(ics_file_path)
+    timings['parse'] += time.perf_counter() - started
+    prefix = ['BEGIN:VCALENDAR'] + header + [line for block in timezones for line in block]
+    return prefix, uid_counts
+
+
+def iter_ics_events(ics_file_path, start, end, timings=None):
+    '''Streams the event occurrences of an .ics file between start and end.
+
+    The file is read twice, line by line, and never held in memory as a
+    whole. The first pass collects time zones and counts VEVENTs per UID;
+    the second parses one VEVENT at a time, together with any modified
+    occurrences (RECURRENCE-ID) of the same UID, and expands it only if
+    it can fall in the window.
+
+    If given, timings['parse'] and timings['expand'] are incremented by the
+    seconds spent in each stage.
+    '''
+    if timings is None:
+        timings = {}
+    prefix, uid_counts = _calendar_prefix(ics_file_path, timings)
+    for events in _event_groups(ics_file_path, uid_counts):
+        if _may_overlap([line for event in events for line in event], start, end):
+            yield from _expand_group(prefix, events, start, end, timings)
+
+
+def iter_cached_rows(ics_file_path, start, end, cache, timings=None):
+    '''Like iter_ics_events, but yields rows and takes them from an
+    ExpansionCache for every event group that has not changed since the
+    cache was written. Only new or edited events are expanded in full, and
+    unchanged ones only over the part of the window the cache lacks.
+    '''
+    if timings is None:
+        timings = {}
+    prefix, uid_counts = _calendar_prefix(ics_file_path, timings)
+    calendar_key = ExpansionCache.calendar_key(prefix)
+    for events in _event_groups(ics_file_path, uid_counts):
+        lines = [line for event in events for line in event]
+        if not _may_overlap(lines, start, end):
+            continue
+
+        def expand(span_start, span_end, events=events, lines=lines):
+            if not _may_overlap(lines, span_start, span_end):
+                return []
+            return [event_row(event)
+                    for event in _expand_group(prefix, events, span_start, span_end, timings)]
+
+        key = cache.group_key(calendar_key, lines)
+        # events without a UID can't be told apart across runs but by content
+        yield from cache.rows(_property(lines, 'UID') or key, key, start, end, expand)
+
+
+def default_window(days_before=1, days_after=365):
+    '''The exported time window: by default from yesterday to a year from now.'''
+    now = datetime.datetime.now()
+    return now - datetime.timedelta(days=days_before), now + datetime.timedelta(days=days_after)
+
+
+def calendar_events(ics_file_path, start, end, stream=False, timings=None):
+    '''Expanded event occurrences of an .ics file between start and end.
+
+    If given, timings['parse'] and timings['expand'] receive the seconds
+    spent in each stage.
+    '''
+    if stream:
+        return iter_ics_events(ics_file_path, start, end, timings)
+
+    from icalendar import Calendar
+    import recurring_ical_events
+
+    started = time.perf_counter()
     with open(ics_file_path, 'rb') as file:
         calendar = Calendar.from_ical(file.read())
+    parsed = time.perf_counter()
+    events = recurring_ical_events.of(calendar).between(start, end)
+    if timings is not None:
+        timings['parse'] = parsed - started
+        timings['expand'] = time.perf_counter() - parsed
+    return events
 
-    events = recurring_ical_events.of(calendar).between(datetime.datetime.now() - datetime.timedelta(days=1), datetime.datetime.now() + datetime.timedelta(days=365))
 
-    event_list = []
+def ics_to_excel(ics_file_path, excel_file_path, stream=False, fmt=None,
+                 start=None, end=None, cache_path=None):
+    '''Converts iCalender file to spreadsheet
 
-    for event in events:
-        event_summary = str(event.get('summary'))
-        event_start = remove_timezone(event.get('dtstart').dt)
-        event_end = remove_timezone(event.get('dtend').dt)
-        event_description = str(event.get('description'))
-        event_location = str(event.get('location'))
+    Rows go straight from the expanded events to the output writer, which
+    is picked from fmt ('xlsx', 'csv', 'parquet' or 'arrow') or else from
+    the output file's extension.
 
-        event_data = {
-            'Summary': event_summary,
-            'Start': event_start,
-            'End': event_end,
-            'Description': event_description,
-            'Location': event_location
-        }
-        event_list.append(event_data)
+    With stream=True the calendar is read one event at a time instead of
+    being loaded whole, which keeps memory flat for very large files.
 
-    df = pd.DataFrame(event_list)
-    df.to_excel(excel_file_path, index=False)
+    Occurrences between start and end are exported (default_window() for
+    whichever is missing). With a cache_path, expanded rows are kept in an
+    ExpansionCache there so the next run only expands what changed; this
+    implies stream=True.
 
+    returns -> Counter: with a cache, how many events were 'reused',
+               'extended' or 'expanded'; else empty.
+    '''
+    default_start, default_end = default_window()
+    start = start or default_start
+    end = end or default_end
+
+    cache = ExpansionCache(cache_path) if cache_path else None
+    if cache is not None:
+        rows = iter_cached_rows(ics_file_path, start, end, cache)
+    else:
+        rows = (event_row(event) for event in calendar_events(ics_file_path, start, end, stream))
+
+    with open_writer(excel_file_path, fmt) as writer:
+        for row in rows:
+            writer.write(row)
+
+    if cache is None:
+        return Counter()
+    cache.save()
+    return cache.stats
+
+
+def find_calendars(source):
+    '''The .ics files in a directory, or matching a glob pattern, sorted.'''
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.ics')
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+
+def _expand_calendar(ics_file_path, start, end, stream):
+    '''Worker side of batch_convert: parse and expand one calendar.'''
+    timings = {}
+    rows = [event_row(event) for event in calendar_events(ics_file_path, start, end, stream, timings)]
+    # in streaming mode expansion is interleaved with building the rows
+    return rows, timings['parse'], timings['expand']
+
+
+def _sheet_names(paths):
+    '''Unique Excel-safe sheet names derived from the calendar file names.'''
+    names = []
+    for path in paths:
+        base = os.path.splitext(os.path.basename(path))[0]
+        base = ''.join('_' if c in '[]:*?/\\' else c for c in base)[:31] or 'calendar'
+        name, counter = base, 2
+        while name.lower() in (n.lower() for n in names):
+            suffix = f'~{counter}'
+            name, counter = base[:31 - len(suffix)] + suffix, counter + 1
+        names.append(name)
+    return names
+
+
+def batch_convert(source, output_path, workers=None, combined=False, stream=False, fmt=None,
+                  start=None, end=None):
+    '''Converts many .ics files into one output in a single run.
+
+    Calendars are parsed and expanded in parallel worker processes and
+    written in file-name order, either one sheet per calendar or, with
+    combined=True, one sheet with a Source column. Formats other than xlsx
+    have no sheets and are always combined.
+
+    :param source: Directory of .ics files or a glob pattern.
+    :param output_path: Output file; its extension or fmt picks the writer.
+    :param start, end: Exported window (default_window() for whichever is missing).
+
+    returns -> list: per calendar, its rows and parse/expand/write seconds.
+    '''
+    paths = find_calendars(source)
+    if not paths:
+        raise FileNotFoundError(f'No .ics files found for {source!r}')
+
+    fmt = output_format(output_path, fmt)
+    combined = combined or fmt != 'xlsx'
+    default_start, default_end = default_window()
+    start = start or default_start
+    end = end or default_end
+    sheets = _sheet_names(paths)
+    report = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_expand_calendar, path, start, end, stream) for path in paths]
+        if combined:
+            writer = open_writer(output_path, fmt, columns=COLUMNS + ['Source'])
+        else:
+            writer = open_writer(output_path, fmt)
+            writer.rename_sheet(sheets[0])
+        with writer:
+            for index, (path, future) in enumerate(zip(paths, futures)):
+                rows, parse_seconds, expand_seconds = future.result()
+                started = time.perf_counter()
+                if combined:
+                    source_name = os.path.basename(path)
+                    for row in rows:
+                        writer.write(row + (source_name,))
+                else:
+                    if index:
+                        writer.add_sheet(sheets[index])
+                    for row in rows:
+                        writer.write(row)
+                report.append({
+                    'file': path,
+                    'rows': len(rows),
+                    'parse_seconds': parse_seconds,
+                    'expand_seconds': expand_seconds,
+                    'write_seconds': time.perf_counter() - started,
+                })
+    return report
+
+
+def print_batch_report(report):
+    print(f"{'calendar':<40}{'rows':>9}{'parse s':>9}{'expand s':>10}{'write s':>9}")
+    for entry in report:
+        print(f"{os.path.basename(entry['file'])[:39]:<40}{entry['rows']:>9}"
+              f"{entry['parse_seconds']:>9.2f}{entry['expand_seconds']:>10.2f}"
+              f"{entry['write_seconds']:>9.2f}")
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
 
-# Execution
-if __name__ == "__main__":
 
-    file_to_convert = None
-    output_filename = 'output.xlsx'
+def _synthetic_rows(rows):
+    start = datetime.datetime(2024, 1, 1, 9)
+    for i in range(rows):
+        begin = start + datetime.timedelta(minutes=30 * i)
+        yield (f'Meeting {i}', begin, begin + datetime.timedelta(hours=1),
+               'Weekly sync about the roadmap and open issues', f'Room {i % 12}')
 
-    cli_inputs = process_filenames(sys.argv)
-    print(cli_inputs)
 
-    if len(cli_inputs) < 2:
+def _benchmark_writer(fmt, rows, path, queue):
+    try:
+        baseline = _peak_rss_mb()
+        started = time.perf_counter()
+        if fmt == 'pandas-xlsx':
+            # the previous list-of-dicts -> DataFrame -> to_excel path
+            import pandas as pd
+            pd.DataFrame([dict(zip(COLUMNS, row)) for row in _synthetic_rows(rows)]) \
+                .to_excel(path, index=False)
+        else:
+            with open_writer(path, fmt) as writer:
+                for row in _synthetic_rows(rows):
+                    writer.write(row)
+        seconds = time.perf_counter() - started
+        queue.put({'seconds': seconds, 'baseline': baseline, 'peak': _peak_rss_mb()})
+    except ImportError as e:
+        queue.put({'skipped': f'{e.name or e} is not installed'})
+    except Exception as e:
+        queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def _benchmark_result(process, queue):
+    '''The child's report, or an error if it died without one.'''
+    import queue as queues
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except queues.Empty:
+            if not process.is_alive():
+                # it may have put its report just before exiting
+                try:
+                    return queue.get(timeout=1)
+                except queues.Empty:
+                    return {'error': f'writer process exited with code {process.exitcode}'}
+
+
+def benchmark_writers(rows=200_000, formats=None):
+    '''Times every output writer on synthetic rows, each in a fresh process
+    so peak RSS is measured per writer. Includes the old pandas path.
+
+    Formats whose library isn't installed are reported as skipped.
+
+    returns -> dict: format -> {'rows_per_sec', 'seconds', 'peak_rss_mb', 'rss_growth_mb'},
+               or {'skipped': reason} / {'error': message}
+    '''
+    import multiprocessing
+    import tempfile
+
+    formats = formats or ['pandas-xlsx'] + list(FORMATS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            extension = 'xlsx' if fmt == 'pandas-xlsx' else fmt
+            path = os.path.join(tmp, f'{fmt}.{extension}')
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_benchmark_writer, args=(fmt, rows, path, queue))
+            process.start()
+            report = _benchmark_result(process, queue)
+            process.join()
+            if 'seconds' not in report:
+                results[fmt] = report
+                continue
+            seconds, baseline, peak = report['seconds'], report['baseline'], report['peak']
+            results[fmt] = {
+                'seconds': seconds,
+                'rows_per_sec': rows / seconds,
+                'peak_rss_mb': peak,
+                'rss_growth_mb': peak - baseline if peak is not None else None,
+            }
+
+    print(f"{'writer':<12}{'rows/sec':>12}{'seconds':>10}{'peak RSS MB':>13}{'growth MB':>11}")
+    for fmt, result in results.items():
+        if 'seconds' not in result:
+            print(f"{fmt:<12}{'skipped: ' + result['skipped'] if 'skipped' in result else 'failed: ' + result['error']}")
+            continue
+        peak = result['peak_rss_mb']
+        growth = result['rss_growth_mb']
+        print(f"{fmt:<12}{result['rows_per_sec']:>12,.0f}{result['seconds']:>10.2f}"
+              f"{peak if peak is not None else float('nan'):>13.1f}"
+              f"{growth if growth is not None else float('nan'):>11.1f}")
+    return results
+
+
+def output_filename_for(name, fmt=None):
+    '''Output name with the right extension for its format (xlsx by default).'''
+    fmt = output_format(name, fmt)
+    extension = 'feather' if fmt == 'arrow' and name.lower().endswith('.feather') else fmt
+    name_parts = name.split('.')
+    if len(name_parts) > 1:
+        name_parts[-1] = extension
+        return '.'.join(name_parts)
+    return f'{name}.{extension}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Converts an iCalendar file into a spreadsheet')
+    parser.add_argument('files', nargs='*',
+                        help='`.ics` path and optionally an output name (defaults to `output.xlsx`)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read the calendar one event at a time (for very large files)')
+    parser.add_argument('--format', choices=sorted(FORMATS),
+                        help='Output format (default: from the output extension, else xlsx)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Convert every .ics in a directory (or matching a glob) into one output')
+    parser.add_argument('--combined', action='store_true',
+                        help='With --batch: one sheet with a Source column instead of a sheet per calendar')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='With --batch: number of worker processes (default: CPU count)')
+    parser.add_argument('--days-before', type=float, default=1,
+                        help='Export occurrences from this many days ago (default: 1)')
+    parser.add_argument('--days-after', type=float, default=365,
+                        help='Export occurrences up to this many days ahead (default: 365)')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='Expansion cache file; re-runs only expand new or changed events')
+    parser.add_argument('--benchmark-writers', type=int, nargs='?', const=200_000, metavar='ROWS',
+                        help='Compare rows/sec and peak RSS of every output writer')
+    args = parser.parse_args()
+
+    if args.benchmark_writers:
+        benchmark_writers(args.benchmark_writers)
+        return 0
+
+    # argv may split unquoted names with spaces into several arguments;
+    # batch sources are directories, which have no extension to split on
+    cli_inputs = args.files if args.batch else \
+        [name.strip() for name in process_filenames(args.files)]
+
+    if not cli_inputs:
         print('''Please provide `.ics`* path and optionally, an expected output name (defaults to `output.xlsx`).
             E.g: `python converter.py /dir/file_to_convert.ics converted_file.xlsx`
             ''')
-    else:
-        
-        file_to_convert = cli_inputs[1]
-        if len(cli_inputs[1:]) >= 2:
+        return 1
 
-            input_filename = cli_inputs[2]
-            input_filename_parts = input_filename.split('.')
-            
-            if len(input_filename_parts) > 1:
-                input_filename_parts[-1] = 'xlsx'
-                input_filename = '.'.join(input_filename_parts)
-            else:
-                input_filename += '.xlsx'
+    file_to_convert = cli_inputs[0]
+    output_filename = output_filename_for(cli_inputs[1] if len(cli_inputs) > 1 else 'output',
+                                          args.format)
 
-            output_filename = input_filename
+    start, end = default_window(args.days_before, args.days_after)
+    if args.batch:
+        report = batch_convert(file_to_convert, output_filename, workers=args.workers,
+                               combined=args.combined, stream=args.stream, fmt=args.format,
+                               start=start, end=end)
+        print_batch_report(report)
+        print(f'{len(report)} calendars converted -> {output_filename}')
+        return 0
 
-        ics_to_excel(ics_file_path=file_to_convert, excel_file_path=output_filename)
+    stats = ics_to_excel(ics_file_path=file_to_convert, excel_file_path=output_filename,
+                         stream=args.stream, fmt=args.format, start=start, end=end,
+                         cache_path=args.cache)
+    if args.cache:
+        print(f"Expansion cache: {stats['reused']} events reused, {stats['extended']} extended, "
+              f"{stats['expanded']} expanded")
 
     print(f'Your file was successfully converted -> {output_filename}')
+    return 0
+
+
+# Execution
+if __name__ == "__main__":
+    main()
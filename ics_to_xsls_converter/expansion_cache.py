@@ -0,0 +1,103 @@
+'''On-disk cache of expanded event occurrences, for cheap daily re-runs.
+
+Entries are keyed by event UID and hold a key of the event's content, the
+window it was expanded over and the resulting rows.
+'''
+import datetime
+import hashlib
+import os
+import pickle
+from collections import Counter
+
+
+def in_window(start, end, row):
+    '''Whether a row's occurrence falls between start and end, with the
+    same rule recurring_ical_events uses to select occurrences.'''
+    row_start, row_end = _comparable(row[1]), _comparable(row[2])
+    start, end = _comparable(start), _comparable(end)
+    if row_start == row_end:
+        return start <= row_start < end
+    return row_start < end and start < row_end
+
+
+def _comparable(value):
+    # rows hold naive datetimes, or dates for all-day events
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None)
+    return datetime.datetime.combine(value, datetime.time())
+
+
+class ExpansionCache:
+    '''Expanded rows per event UID, reused while the event is unchanged.
+
+    An event's key hashes its raw lines (so SEQUENCE and LAST-MODIFIED,
+    but also edits that bump neither) together with the calendar's time
+    zones, leaving out DTSTAMP, which some servers rewrite on every export.
+    Rows are reused when the cached window covers the requested one; when
+    the window has only moved forward, just the new tail is expanded.
+
+    Use one cache file per calendar: entries for UIDs not seen during a run
+    are dropped when it is saved.
+    '''
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = Counter()
+        self._entries = {}
+        self._seen = {}
+        try:
+            with open(path, 'rb') as file:
+                data = pickle.load(file)
+            if data.get('version') == self.VERSION:
+                self._entries = data['entries']
+        except FileNotFoundError:
+            pass
+        except (pickle.UnpicklingError, EOFError, AttributeError, KeyError) as e:
+            print(f'Ignoring unreadable expansion cache {path}: {e}')
+
+    @staticmethod
+    def calendar_key(prefix):
+        '''Digest of the calendar-level lines every event is parsed with.'''
+        return hashlib.sha256('\n'.join(prefix).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def group_key(calendar_key, lines):
+        '''Digest identifying one version of an event group.'''
+        digest = hashlib.sha256(calendar_key.encode('ascii'))
+        for line in lines:
+            if not line.upper().startswith(('DTSTAMP:', 'DTSTAMP;')):
+                digest.update(line.encode('utf-8'))
+                digest.update(b'\n')
+        return digest.hexdigest()
+
+    def rows(self, uid, key, start, end, expand):
+        '''Rows of the event group `uid` between start and end.
+
+        :param key: group_key of the group as it is now.
+        :param expand: expand(span_start, span_end) -> list of rows, called
+                       for whatever the cache can't answer.
+        '''
+        entry = self._entries.get(uid)
+        if entry is None or entry['key'] != key or not entry['start'] <= start <= entry['end']:
+            self.stats['expanded'] += 1
+            rows = expand(start, end)
+        else:
+            rows = [row for row in entry['rows'] if in_window(start, end, row)]
+            if end <= entry['end']:
+                self.stats['reused'] += 1
+            else:
+                self.stats['extended'] += 1
+                known = set(rows)
+                rows += [row for row in expand(entry['end'], end) if row not in known]
+        self._seen[uid] = {'key': key, 'start': start, 'end': end, 'rows': rows}
+        return rows
+
+    def save(self):
+        '''Writes the entries used in this run, replacing the file atomically.'''
+        partial = self.path + '.partial'
+        with open(partial, 'wb') as file:
+            pickle.dump({'version': self.VERSION, 'entries': self._seen}, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, self.path)
@@ -0,0 +1,175 @@
+'''Output stage for the ICS converter.
+
+Every writer takes rows as tuples in COLUMNS order, one at a time, and
+never holds more than one batch of them in memory.
+'''
+import csv
+import datetime
+import os
+
+
+COLUMNS = ['Summary', 'Start', 'End', 'Description', 'Location']
+BATCH_SIZE = 50_000
+
+
+class ColumnBatch:
+    '''Accumulates rows column by column and hands them out in batches.'''
+
+    def __init__(self, columns, batch_size=BATCH_SIZE):
+        self.columns = columns
+        self.batch_size = batch_size
+        self._data = [[] for _ in columns]
+
+    def __len__(self):
+        return len(self._data[0])
+
+    def append(self, row):
+        for column, value in zip(self._data, row):
+            column.append(value)
+        return len(self._data[0]) >= self.batch_size
+
+    def take(self):
+        data = self._data
+        self._data = [[] for _ in self.columns]
+        return data
+
+
+class XlsxWriter:
+    '''Streams rows into an .xlsx workbook with openpyxl's write-only mode,
+    which flushes rows to disk as they come instead of keeping cells.'''
+
+    def __init__(self, path, columns=COLUMNS, sheet='Sheet1'):
+        from openpyxl import Workbook
+        self.path = path
+        self.columns = columns
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self.add_sheet(sheet)
+
+    def add_sheet(self, name, columns=None):
+        '''Starts a new sheet; following rows go there.'''
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+        self._sheet = self._workbook.create_sheet(title=name[:31])
+        header = []
+        for title in columns or self.columns:
+            cell = WriteOnlyCell(self._sheet, value=title)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        self._sheet.append(header)
+
+    def rename_sheet(self, name):
+        '''Renames the current sheet.'''
+        self._sheet.title = name[:31]
+
+    def write(self, row):
+        self._sheet.append(row)
+
+    def close(self):
+        self._workbook.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter:
+    '''Writes rows to CSV in batches.'''
+
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+        self._batch = ColumnBatch(columns, batch_size)
+
+    def write(self, row):
+        if self._batch.append(row):
+            self._flush()
+
+    def _flush(self):
+        self._writer.writerows(zip(*self._batch.take()))
+
+    def close(self):
+        if len(self._batch):
+            self._flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _as_datetime(value):
+    # all-day events start on a date; Arrow needs one type per column
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime.combine(value, datetime.time())
+    return value
+
+
+class ArrowWriter:
+    '''Writes rows as Parquet or Arrow IPC (feather) record batches.'''
+
+    def __init__(self, path, columns=COLUMNS, fmt='parquet', batch_size=BATCH_SIZE):
+        import pyarrow as pa
+        self._pa = pa
+        self._schema = pa.schema([
+            (name, pa.timestamp('us') if name in ('Start', 'End') else pa.string())
+            for name in columns
+        ])
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+        self._batch = ColumnBatch(columns, batch_size)
+
+    def write(self, row):
+        if self._batch.append(row):
+            self._flush()
+
+    def _flush(self):
+        arrays = []
+        for field, values in zip(self._schema, self._batch.take()):
+            if field.type == self._pa.string():
+                arrays.append(self._pa.array(values, type=field.type))
+            else:
+                arrays.append(self._pa.array([_as_datetime(v) for v in values], type=field.type))
+        self._writer.write_batch(self._pa.record_batch(arrays, schema=self._schema))
+
+    def close(self):
+        if len(self._batch):
+            self._flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+FORMATS = {
+    'xlsx': XlsxWriter,
+    'csv': CsvWriter,
+    'parquet': lambda path, columns=COLUMNS: ArrowWriter(path, columns, 'parquet'),
+    'arrow': lambda path, columns=COLUMNS: ArrowWriter(path, columns, 'arrow'),
+}
+
+
+def output_format(path, fmt=None):
+    '''The writer format for path: fmt if given, else its extension, else xlsx.'''
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1][1:].lower()
+    if extension == 'feather':
+        return 'arrow'
+    return extension if extension in FORMATS else 'xlsx'
+
+
+def open_writer(path, fmt=None, columns=COLUMNS):
+    '''Opens the writer for path; see output_format for how it is chosen.'''
+    return FORMATS[output_format(path, fmt)](path, columns=columns)
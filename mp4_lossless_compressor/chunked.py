@@ -0,0 +1,250 @@
+"""Segment-parallel encoding for compress_lossless.
+
+The video stream is cut at keyframes into segments without re-encoding,
+the segments are encoded by separate ffmpeg processes at the same time,
+and the results are joined with the concat demuxer (again without
+re-encoding). Audio is taken once from the whole input, so it has no
+seams at segment boundaries.
+
+Every step runs through telemetry.run_ffmpeg: the progress of the segment
+encodes running side by side is combined into one Progress over the whole
+file for on_progress, and each step's own progress goes to the log.
+"""
+import glob
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .probe_cache import run_ffprobe
+    from .telemetry import Progress, run_ffmpeg
+except ImportError:
+    from probe_cache import run_ffprobe
+    from telemetry import Progress, run_ffmpeg
+
+
+def default_segments():
+    """One segment per four cores: x264/x265 still scale well at that width."""
+    return max(2, (os.cpu_count() or 1) // 4)
+
+
+def segment_bitrates(durations, target_bitrate_kbps, weights=None):
+    """Share out a bitrate budget between segments.
+
+    The budget is target_bitrate_kbps over the summed duration. Every
+    segment gets the same rate unless weights are given, in which case
+    rates are proportional to them and the total size stays the same.
+
+    returns -> list: bitrate in kbps per segment.
+    """
+    if weights is None:
+        weights = [1.0] * len(durations)
+    total_seconds = sum(durations)
+    weighted_seconds = sum(w * d for w, d in zip(weights, durations))
+    if not weighted_seconds:
+        return [target_bitrate_kbps] * len(durations)
+    scale = target_bitrate_kbps * total_seconds / weighted_seconds
+    return [max(1, int(scale * w)) for w in weights]
+
+
+class _CombinedProgress:
+    """Folds the progress of segment encodes running side by side into one
+    Progress over the whole file.
+
+    fps, speed and ETA are those of all running encodes together; a
+    segment that is done counts with its full duration.
+    """
+
+    def __init__(self, durations, on_progress):
+        self.durations = durations
+        self.on_progress = on_progress
+        self.latest = [None] * len(durations)
+        self._lock = threading.Lock()
+
+    def segment(self, index):
+        """The on_progress callback for segment `index`."""
+        def update(progress):
+            with self._lock:
+                self.latest[index] = progress
+                self.on_progress(self._combined())
+        return update
+
+    def finish(self):
+        with self._lock:
+            self.on_progress(self._combined(done=True))
+
+    def _combined(self, done=False):
+        duration = sum(self.durations)
+        reported = [p for p in self.latest if p is not None]
+        running = [p for p in reported if not p.done]
+        out_time = sum(d if p.done else p.out_time or 0.0
+                       for p, d in zip(self.latest, self.durations) if p is not None)
+        total_size = sum(p.total_size or 0 for p in reported)
+        speed = sum(p.speed or 0.0 for p in running)
+        if done:
+            percent, eta = 100.0, 0.0
+        else:
+            percent = min(100.0, out_time / duration * 100) if duration else None
+            eta = max(0.0, (duration - out_time) / speed) if duration and speed else None
+        return Progress(
+            frame=sum(p.frame or 0 for p in reported),
+            fps=sum(p.fps or 0.0 for p in running),
+            bitrate_kbps=total_size * 8 / 1000 / out_time if out_time else None,
+            total_size=total_size,
+            out_time=out_time,
+            speed=speed,
+            percent=percent,
+            eta=eta,
+            done=done,
+        )
+
+
+def split_at_keyframes(input_path, segments, duration, workdir, progress_log=None):
+    """Copy the first video stream of input_path into about `segments`
+    pieces, each starting at a keyframe.
+
+    returns -> list: (path, duration) per piece, in order.
+    """
+    import ffmpeg
+    times = [duration * i / segments for i in range(1, segments)]
+    pattern = os.path.join(workdir, 'source_%04d.mkv')
+    run_ffmpeg(
+        ffmpeg
+        .input(input_path)
+        .output(pattern, map='0:v:0', c='copy', f='segment',
+                segment_times=','.join(f'{t:.3f}' for t in times), reset_timestamps=1)
+        .overwrite_output()
+        .compile(),
+        duration=duration,
+        log_path=progress_log
+    )
+    pieces = []
+    for path in sorted(glob.glob(os.path.join(workdir, 'source_*.mkv'))):
+        pieces.append((path, float(run_ffprobe(path)['format']['duration'])))
+    return pieces
+
+
+def _encode_segment(source, output, bitrate_kbps, vcodec, threads, video_params,
+                    duration=None, on_progress=None, progress_log=None):
+    import ffmpeg
+    started = time.perf_counter()
+    run_ffmpeg(
+        ffmpeg
+        .input(source)
+        .output(output, vcodec=vcodec, video_bitrate=f'{bitrate_kbps}k', preset='medium',
+                threads=threads, **video_params)
+        .overwrite_output()
+        .compile(),
+        duration=duration,
+        on_progress=on_progress,
+        log_path=progress_log
+    )
+    return time.perf_counter() - started
+
+
+def encode_chunked(input_path, output_path, duration, target_bitrate_kbps, vcodec='libx264',
+                   segments=None, video_params=None, has_audio=True, audio_params=None,
+                   weights=None, cpus=None, on_progress=None, progress_log=None):
+    """Encode input_path to output_path as `segments` pieces in parallel.
+
+    :param target_bitrate_kbps: Video bitrate budget for the whole file.
+    :param video_params: Extra ffmpeg output options per segment (vf, r, ...).
+    :param audio_params: ffmpeg options for the audio, encoded once over the
+                         whole file (default AAC 128k); {'acodec': 'copy'}
+                         keeps the original audio.
+    :param weights: Optional relative complexity per segment, see
+                    segment_bitrates. Called with the piece durations if
+                    it is a callable.
+    :param cpus: Threads to share between the segment encodes (default: all).
+    :param on_progress: Called with a telemetry.Progress over the whole file
+                        while the segments encode, and once more with
+                        done=True when the output is complete.
+    :param progress_log: Append the progress of the split, of every segment
+                         encode and of the concat here as JSON lines (see
+                         telemetry.run_ffmpeg).
+
+    returns -> dict: per-segment durations, bitrates and encode seconds,
+               plus split/encode/concat/wall seconds.
+    raises -> subprocess.CalledProcessError: if a step fails.
+    """
+    import ffmpeg
+
+    segments = segments or default_segments()
+    video_params = video_params or {}
+    audio_params = audio_params or {'acodec': 'aac', 'audio_bitrate': '128k'}
+    cpus = cpus or os.cpu_count() or 1
+    workers = min(segments, cpus)
+    threads = max(1, cpus // workers)
+    started = time.perf_counter()
+
+    workdir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix='.chunks-', dir=workdir) as tmp:
+        pieces = split_at_keyframes(input_path, segments, duration, tmp, progress_log)
+        split_done = time.perf_counter()
+
+        durations = [piece_duration for _, piece_duration in pieces]
+        if callable(weights):
+            weights = weights(durations)
+        bitrates = segment_bitrates(durations, target_bitrate_kbps, weights)
+        outputs = [os.path.join(tmp, f'encoded_{i:04d}.mkv') for i in range(len(pieces))]
+        combined = _CombinedProgress(durations, on_progress) if on_progress is not None else None
+
+        def encode(i):
+            return _encode_segment(pieces[i][0], outputs[i], bitrates[i], vcodec, threads, video_params,
+                                   duration=durations[i],
+                                   on_progress=combined.segment(i) if combined is not None else None,
+                                   progress_log=progress_log)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            seconds = list(pool.map(encode, range(len(pieces))))
+        encode_done = time.perf_counter()
+
+        list_path = os.path.join(tmp, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for output in outputs:
+                f.write("file '{}'\n".format(output.replace("'", r"'\''")))
+        streams = [ffmpeg.input(list_path, f='concat', safe=0)['v']]
+        if has_audio:
+            streams.append(ffmpeg.input(input_path)['a'])
+            params = dict(audio_params)
+        else:
+            params = {}
+        run_ffmpeg(
+            ffmpeg
+            .output(*streams, output_path, vcodec='copy', **params)
+            .overwrite_output()
+            .compile(),
+            duration=duration,
+            log_path=progress_log
+        )
+        finished = time.perf_counter()
+    if combined is not None:
+        combined.finish()
+
+    return {
+        'segments': [
+            {'duration': d, 'bitrate_kbps': b, 'seconds': s}
+            for d, b, s in zip(durations, bitrates, seconds)
+        ],
+        'threads_per_segment': threads,
+        'split_seconds': split_done - started,
+        'encode_seconds': encode_done - split_done,
+        'concat_seconds': finished - encode_done,
+        'wall_seconds': finished - started,
+    }
+
+
+def print_chunked_report(report, single_seconds=None):
+    """Print per-segment times and, if known, the speedup over one process."""
+    print(f"\n🧩 Chunked encode: {len(report['segments'])} segments, "
+          f"{report['threads_per_segment']} threads each")
+    for i, segment in enumerate(report['segments']):
+        print(f"   #{i:<3} {segment['duration']:8.1f}s  {segment['bitrate_kbps']:>7} kbps  "
+              f"encoded in {segment['seconds']:.1f}s")
+    print(f"   Split {report['split_seconds']:.1f}s, encode {report['encode_seconds']:.1f}s, "
+          f"concat {report['concat_seconds']:.1f}s, total {report['wall_seconds']:.1f}s")
+    if single_seconds:
+        print(f"   Single process: {single_seconds:.1f}s → "
+              f"speedup {single_seconds / report['wall_seconds']:.2f}x")
@@ -0,0 +1,204 @@
+"""How hard each part of a video is to encode, measured on its pixels.
+
+ffmpeg decodes the video and pipes small grayscale frames (160 px wide, at
+most 10 per second) as rawvideo. They are read in batches straight into a
+reused buffer and viewed as a NumPy array without copying, so memory stays
+at a few MB however long the video is. Per frame two numbers come out:
+
+* motion, the mean absolute difference from the previous frame, which is
+  what inter frames have to encode, and
+* detail, the mean absolute horizontal plus vertical gradient, which is
+  what every frame costs in texture.
+
+Both are averaged over windows of a few seconds and combined into one
+complexity value per window, normalized so the whole video averages 1.0.
+segment_weights turns that timeline into relative bitrates for the pieces
+of a segmented encode (see chunked.py): static talking heads give bits to
+high-motion scenes, and the total size stays the same.
+"""
+import subprocess
+import threading
+import time
+from collections import deque, namedtuple
+
+try:
+    from .probe_cache import probe
+except ImportError:
+    from probe_cache import probe
+
+
+ANALYSIS_WIDTH = 160
+SAMPLE_FPS = 10
+WINDOW_SECONDS = 2.0
+# motion costs more bits than the same amount of texture, which inter
+# frames mostly predict from the previous frame
+MOTION_WEIGHT = 2.0
+# weight = complexity ** STRENGTH: the bits a scene needs grow slower than
+# its complexity, and a flat scene still needs some
+STRENGTH = 0.6
+MIN_WEIGHT, MAX_WEIGHT = 0.5, 2.0
+# about this many seconds per segment when an encode is cut to follow the content
+SEGMENT_SECONDS = 20
+MAX_SEGMENTS = 32
+BATCH_BYTES = 4 * 1024 * 1024
+
+Timeline = namedtuple('Timeline', 'window_seconds motion detail complexity frames duration seconds')
+
+
+def _frame_rate(stream):
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        numerator, _, denominator = stream.get(key, '0/1').partition('/')
+        try:
+            rate = float(numerator) / float(denominator or 1)
+        except (ValueError, ZeroDivisionError):
+            continue
+        if rate:
+            return rate
+    return 0.0
+
+
+def _read_into(pipe, view):
+    """Fill view from pipe; returns the bytes read (less only at EOF)."""
+    filled = 0
+    while filled < len(view):
+        count = pipe.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def analyze_complexity(input_path, window_seconds=WINDOW_SECONDS, width=ANALYSIS_WIDTH,
+                       sample_fps=SAMPLE_FPS, threads=None):
+    """Measure motion and detail over time.
+
+    :param window_seconds: Length of the windows the timeline is made of.
+    :param width: Width frames are scaled down to (height keeps the aspect).
+    :param sample_fps: Frames per second analyzed (at most the video's own).
+    :param threads: Decoder threads (default: ffmpeg's choice).
+
+    returns -> Timeline: per-window motion, detail and complexity arrays,
+               the number of frames analyzed, the duration covered and the
+               seconds the analysis took.
+    raises -> RuntimeError: if ffmpeg can't decode the video.
+    """
+    import numpy as np
+
+    info = probe(input_path)
+    stream = next((s for s in info['streams'] if s.get('codec_type') == 'video'
+                   and not s.get('disposition', {}).get('attached_pic')), None)
+    if stream is None:
+        raise RuntimeError(f"{input_path} has no video stream to analyze")
+    height = max(2, round(width * int(stream['height']) / int(stream['width']) / 2) * 2)
+    fps = min(sample_fps, _frame_rate(stream) or sample_fps)
+
+    # Decoding is nearly all of the cost. The analysis doesn't need deblocked
+    # frames, nor the non-reference ones it would mostly drop to sample_fps.
+    command = ['ffmpeg', '-v', 'error', '-nostdin', '-skip_loop_filter', 'all', '-skip_frame', 'noref']
+    if threads:
+        command += ['-threads', str(threads)]
+    command += ['-i', input_path, '-map', '0:v:0', '-an', '-sn',
+                '-vf', f'fps={fps},scale={width}:{height}:flags=area,format=gray',
+                '-f', 'rawvideo', '-']
+
+    frame_bytes = width * height
+    batch = max(2, BATCH_BYTES // frame_bytes)
+    buffer = bytearray(batch * frame_bytes)
+    view = memoryview(buffer)
+    motion, detail = [], []
+    previous = None
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    tail = deque(maxlen=20)
+    drain = threading.Thread(target=lambda: tail.extend(process.stderr), daemon=True)
+    drain.start()
+    try:
+        while True:
+            count = _read_into(process.stdout, view) // frame_bytes
+            if not count:
+                break
+            frames = np.frombuffer(buffer, np.uint8, count * frame_bytes).reshape(count, height, width)
+            pixels = frames.astype(np.int16)
+            detail.append(np.abs(np.diff(pixels, axis=2)).mean(axis=(1, 2))
+                          + np.abs(np.diff(pixels, axis=1)).mean(axis=(1, 2)))
+            if previous is not None:
+                pixels = np.concatenate((previous[np.newaxis], pixels))
+            motion.append(np.abs(np.diff(pixels, axis=0)).mean(axis=(1, 2)))
+            # one frame, not a view that would keep the whole batch alive
+            previous = pixels[-1].copy()
+        returncode = process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        drain.join()
+        process.stdout.close()
+        process.stderr.close()
+    seconds = time.perf_counter() - started
+
+    if returncode or not detail:
+        raise RuntimeError(f"ffmpeg could not decode {input_path} for analysis:\n"
+                           f"{b''.join(tail).decode('utf-8', errors='replace').strip()}")
+
+    detail = np.concatenate(detail)
+    # the first frame has nothing to differ from; count it as its successor
+    motion = np.concatenate(motion)
+    motion = np.concatenate((motion[:1], motion)) if len(motion) else np.zeros(1)
+    frames = len(detail)
+    window = (np.arange(frames) / fps // window_seconds).astype(np.int64)
+    counts = np.bincount(window)
+    present = counts > 0
+    motion_windows = np.bincount(window, motion)[present] / counts[present]
+    detail_windows = np.bincount(window, detail)[present] / counts[present]
+    complexity = detail_windows + MOTION_WEIGHT * motion_windows
+    mean = np.average(complexity, weights=counts[present])
+    complexity = complexity / mean if mean else np.ones_like(complexity)
+    return Timeline(window_seconds, motion_windows, detail_windows, complexity,
+                    frames, frames / fps, seconds)
+
+
+def segment_weights(timeline, durations, strength=STRENGTH):
+    """Relative bitrates for consecutive segments of the given durations.
+
+    Each segment gets the mean complexity of the windows it covers, raised
+    to `strength` and kept within MIN_WEIGHT..MAX_WEIGHT; pass the result
+    to chunked.segment_bitrates (or as encode_chunked's weights).
+
+    returns -> list: one weight per segment.
+    """
+    import numpy as np
+
+    windows = len(timeline.complexity)
+    weights = []
+    start = 0.0
+    for duration in durations:
+        first = min(int(start // timeline.window_seconds), windows - 1)
+        last = max(first + 1, min(windows, int(-(-(start + duration) // timeline.window_seconds))))
+        value = float(np.mean(timeline.complexity[first:last]))
+        weights.append(min(MAX_WEIGHT, max(MIN_WEIGHT, value ** strength)))
+        start += duration
+    return weights
+
+
+def complexity_segments(duration):
+    """How many segments an encode is cut into to follow the content."""
+    return max(2, min(MAX_SEGMENTS, int(duration // SEGMENT_SECONDS)))
+
+
+def print_timeline(timeline, columns=60):
+    """Print the complexity timeline as rows of bars, one character per window."""
+    bars = ' ▁▂▃▄▅▆▇█'
+    top = max(float(timeline.complexity.max()), 1.0)
+    speed = timeline.duration / timeline.seconds if timeline.seconds else float('inf')
+    print(f"\n🔍 SCENE COMPLEXITY ({timeline.frames} frames in {timeline.seconds:.1f}s, "
+          f"{speed:.0f}x realtime; {timeline.window_seconds:g}s per bar, average = 1.0)")
+    for row in range(0, len(timeline.complexity), columns):
+        values = timeline.complexity[row:row + columns]
+        line = ''.join(bars[min(len(bars) - 1, int(value / top * (len(bars) - 1) + 0.5))] for value in values)
+        minutes, seconds = divmod(int(row * timeline.window_seconds), 60)
+        print(f"   {minutes:3d}:{seconds:02d} │{line}")
+    print(f"   Range {timeline.complexity.min():.2f}-{timeline.complexity.max():.2f}; "
+          f"motion {timeline.motion.mean():.1f}, detail {timeline.detail.mean():.1f} (gray levels)")
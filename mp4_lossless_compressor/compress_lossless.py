@@ -1,15 +1,31 @@
-import ffmpeg
+import subprocess
 import sys
 import os
+import time
 import argparse
 
+try:
+    from .chunked import default_segments, encode_chunked, print_chunked_report
+    from .complexity import analyze_complexity, complexity_segments, print_timeline, segment_weights
+    from .ffmpeg_caps import require
+    from .planner import plan_encode, print_plan
+    from .probe_cache import probe, use_cache
+    from .telemetry import console_progress, run_ffmpeg
+except ImportError:
+    from chunked import default_segments, encode_chunked, print_chunked_report
+    from complexity import analyze_complexity, complexity_segments, print_timeline, segment_weights
+    from ffmpeg_caps import require
+    from planner import plan_encode, print_plan
+    from probe_cache import probe, use_cache
+    from telemetry import console_progress, run_ffmpeg
+
 def get_video_info(input_path):
-    """Get comprehensive video information"""
+    """Get comprehensive video information (ffprobe results are cached, see probe_cache)"""
     try:
-        probe = ffmpeg.probe(input_path)
-        video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-        audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
-        format_info = probe['format']
+        probe_info = probe(input_path)
+        video_stream = next((stream for stream in probe_info['streams'] if stream['codec_type'] == 'video'), None)
+        audio_stream = next((stream for stream in probe_info['streams'] if stream['codec_type'] == 'audio'), None)
+        format_info = probe_info['format']
         
         duration = float(format_info['duration'])
         file_size = int(format_info['size'])
@@ -94,21 +110,35 @@ def calculate_target_bitrate(duration, target_size_gb=1.0):
     target_bitrate = (target_size_bytes * 0.9 * 8) / duration  # bits per second
     return int(target_bitrate)
 
-def compress_video_to_size(input_path, output_path=None, target_size_gb=1.0, downscale_to_1080p=False, use_hevc=False, reduce_fps=False):
+def compress_video_to_size(input_path, output_path=None, target_size_gb=1.0, downscale_to_1080p=False, use_hevc=False, reduce_fps=False,
+                           segments=None, copy_audio=False, compare_single=False, plan=False, threads=None,
+                           on_progress=console_progress, progress_log=None, complexity=False):
+    """Compress a video to about target_size_gb.
+
+    With segments > 1 the video is cut at keyframes and the pieces are encoded
+    in parallel (see chunked.py); audio is encoded once over the whole file, or
+    copied with copy_audio. compare_single also times a one-process encode of
+    the same file and reports the speedup.
+
+    With plan=True short sample encodes decide resolution, frame rate and
+    bitrate (see planner.py) instead of the fixed 1080p cap and HEVC discount;
+    downscale_to_1080p and reduce_fps then force those options on.
+
+    With complexity=True the video's motion and detail are measured first
+    (see complexity.py) and the encode is segmented, so complex scenes get
+    more of the bitrate and static ones less, for the same total size.
+
+    threads caps the CPU threads ffmpeg uses (all of them by default), e.g.
+    to run several encodes side by side.
+
+    Progress (fps, speed, bitrate, ETA; see telemetry.py) goes to on_progress
+    and, with a progress_log path, is appended there as JSON lines.
+    """
+    import ffmpeg
+
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input file does not exist: {input_path}")
     
-    if output_path is None:
-        base, _ = os.path.splitext(input_path)
-        suffix = "_compressed"
-        if downscale_to_1080p:
-            suffix += "_1080p"
-        if use_hevc:
-            suffix += "_h265"
-        if reduce_fps:
-            suffix += "_30fps"
-        output_path = f"{base}{suffix}.mp4"
-
     # Get comprehensive video information
     video_info = get_video_info(input_path)
     if video_info is None:
@@ -128,26 +158,64 @@ def compress_video_to_size(input_path, output_path=None, target_size_gb=1.0, dow
     target_bitrate = calculate_target_bitrate(video_info['duration'], target_size_gb)
     target_bitrate_kbps = target_bitrate // 1000
     
-    # Adjust bitrate based on options
-    if downscale_to_1080p:
-        # 1080p needs much less bitrate than 4K
-        target_bitrate_kbps = min(target_bitrate_kbps, 12000)  # Cap at 12Mbps for 1080p
-        print(f"📐 Downscaling to 1080p - using capped bitrate: {target_bitrate_kbps} kbps")
+    # Video codec selection
+    vcodec = 'libx265' if use_hevc else 'libx264'
+
+    if complexity and not (segments and segments > 1):
+        # per-scene bitrates need the video cut into pieces to follow the content
+        segments = complexity_segments(video_info['duration'])
     
-    if use_hevc:
-        # H.265 is more efficient, can use lower bitrate
-        target_bitrate_kbps = int(target_bitrate_kbps * 0.7)  # 30% reduction
-        print(f"🎥 Using H.265 codec - reduced bitrate: {target_bitrate_kbps} kbps")
+    # Fail now rather than hours in if this ffmpeg build can't do the job
+    require(encoders=[vcodec, 'aac'],
+            muxers=['segment'] if segments and segments > 1 else (),
+            filters=['ssim'] if plan else ())
     
+    if plan:
+        # Measure instead of guessing: sample encodes pick resolution, fps and bitrate
+        predictions, run = plan_encode(input_path, video_info, target_bitrate_kbps, vcodec,
+                                       downscale_to_1080p=True if downscale_to_1080p else None,
+                                       reduce_fps=True if reduce_fps else None)
+        print_plan(predictions, run, target_size_gb)
+        best = predictions[0]
+        target_bitrate_kbps = min(target_bitrate_kbps, best.needed_kbps)
+        downscale_to_1080p = best.candidate.vf is not None
+        reduce_fps = best.candidate.fps is not None
+    else:
+        # Adjust bitrate based on options
+        if downscale_to_1080p:
+            # 1080p needs much less bitrate than 4K
+            target_bitrate_kbps = min(target_bitrate_kbps, 12000)  # Cap at 12Mbps for 1080p
+            print(f"📐 Downscaling to 1080p - using capped bitrate: {target_bitrate_kbps} kbps")
+        
+        if use_hevc:
+            # H.265 is more efficient, can use lower bitrate
+            target_bitrate_kbps = int(target_bitrate_kbps * 0.7)  # 30% reduction
+            print(f"🎥 Using H.265 codec - reduced bitrate: {target_bitrate_kbps} kbps")
+    
+    # named after what is encoded, which the plan may have changed
+    if output_path is None:
+        base, _ = os.path.splitext(input_path)
+        suffix = "_compressed"
+        if downscale_to_1080p:
+            suffix += "_1080p"
+        if use_hevc:
+            suffix += "_h265"
+        if reduce_fps:
+            suffix += "_30fps"
+        output_path = f"{base}{suffix}.mp4"
+
+    weights = None
+    if complexity:
+        timeline = analyze_complexity(input_path, threads=threads)
+        print_timeline(timeline)
+        weights = lambda durations: segment_weights(timeline, durations)
+
     print(f"\n📉 Final target bitrate: {target_bitrate_kbps} kbps")
     print(f"🔄 Starting compression...")
 
     # Build ffmpeg command
     input_stream = ffmpeg.input(input_path)
     
-    # Video codec selection
-    vcodec = 'libx265' if use_hevc else 'libx264'
-    
     # Build output parameters
     output_params = {
         'vcodec': vcodec,
@@ -165,13 +233,33 @@ def compress_video_to_size(input_path, output_path=None, target_size_gb=1.0, dow
     if reduce_fps:
         output_params['r'] = '30'
 
+    if threads:
+        output_params['threads'] = threads
+
     try:
-        (
-            input_stream
-            .output(output_path, **output_params)
-            .overwrite_output()
-            .run(quiet=False)
-        )
+        if segments and segments > 1:
+            video_params = {k: v for k, v in output_params.items() if k in ('vf', 'r')}
+            audio_params = {'acodec': 'copy'} if copy_audio else \
+                {'acodec': output_params['acodec'], 'audio_bitrate': output_params['audio_bitrate']}
+            report = encode_chunked(input_path, output_path, video_info['duration'], target_bitrate_kbps,
+                                    vcodec=vcodec, segments=segments, video_params=video_params,
+                                    has_audio=video_info['audio_codec'] != 'No audio',
+                                    audio_params=audio_params, weights=weights, cpus=threads,
+                                    on_progress=on_progress, progress_log=progress_log)
+            single_seconds = _time_single_encode(input_stream, output_path, output_params,
+                                                 video_info['duration'], on_progress,
+                                                 progress_log) if compare_single else None
+            print_chunked_report(report, single_seconds)
+        else:
+            run_ffmpeg(
+                input_stream
+                .output(output_path, **output_params)
+                .overwrite_output()
+                .compile(),
+                duration=video_info['duration'],
+                on_progress=on_progress,
+                log_path=progress_log
+            )
         
         # Check final file size
         final_size = os.path.getsize(output_path)
@@ -187,12 +275,37 @@ def compress_video_to_size(input_path, output_path=None, target_size_gb=1.0, dow
             
         return output_path
         
-    except ffmpeg.Error as e:
-        print("❌ FFmpeg error:\n", e.stderr.decode(), file=sys.stderr)
+    except subprocess.CalledProcessError as e:
+        print("❌ FFmpeg error:\n", e.stderr, file=sys.stderr)
         raise
 
-def analyze_video_only(input_path):
-    """Just analyze and print video details without compression"""
+def _time_single_encode(input_stream, output_path, output_params, duration=None,
+                        on_progress=None, progress_log=None):
+    """Seconds a one-process encode with the same settings takes (output discarded)"""
+    base, ext = os.path.splitext(output_path)
+    single_path = f"{base}.single{ext}"
+    print(f"⏱️  Timing a single-process encode for comparison...")
+    started = time.perf_counter()
+    try:
+        run_ffmpeg(
+            input_stream.output(single_path, **output_params).overwrite_output().compile(),
+            duration=duration,
+            on_progress=on_progress,
+            log_path=progress_log
+        )
+        return time.perf_counter() - started
+    finally:
+        if os.path.exists(single_path):
+            os.remove(single_path)
+
+def analyze_video_only(input_path, target_size_gb=None, use_hevc=False, complexity=False):
+    """Just analyze and print video details without compression.
+
+    With a target_size_gb, also predict size and quality of the candidate
+    settings for that target from short sample encodes (see planner.py).
+    With complexity=True, also print the scene complexity timeline and how
+    a complexity-driven encode would share out the bitrate.
+    """
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input file does not exist: {input_path}")
     
@@ -242,6 +355,20 @@ def analyze_video_only(input_path):
             target_bitrate_half = calculate_target_bitrate(video_info['duration'], 0.5) // 1000
             print(f"   For 0.5 GB: Use bitrate ~{target_bitrate_half} kbps")
 
+    if target_size_gb and current_size_gb > target_size_gb:
+        target_bitrate_kbps = calculate_target_bitrate(video_info['duration'], target_size_gb) // 1000
+        predictions, run = plan_encode(input_path, video_info, target_bitrate_kbps,
+                                       'libx265' if use_hevc else 'libx264')
+        print_plan(predictions, run, target_size_gb)
+
+    if complexity:
+        timeline = analyze_complexity(input_path)
+        print_timeline(timeline)
+        segments = complexity_segments(video_info['duration'])
+        weights = segment_weights(timeline, [video_info['duration'] / segments] * segments)
+        print(f"   With --complexity: {segments} segments at {min(weights):.2f}x to "
+              f"{max(weights):.2f}x the average bitrate")
+
 def main():
     parser = argparse.ArgumentParser(description="Video Compressor - Compress videos to target size")
     parser.add_argument("input", help="Path to the input video file")
@@ -249,18 +376,35 @@ def main():
     parser.add_argument("-s", "--size", type=float, default=1.0, 
                        help="Target file size in GB (default: 1.0)")
     parser.add_argument("-a", "--analyze", action="store_true",
-                       help="Only analyze the video without compressing (ignores other options)")
+                       help="Only analyze the video and predict the outcome for --size from sample encodes")
     parser.add_argument("--1080p", action="store_true",
                        help="Downscale 4K video to 1080p for much smaller file sizes")
     parser.add_argument("--hevc", action="store_true",
                        help="Use H.265/HEVC codec for better compression (slower encoding)")
     parser.add_argument("--30fps", action="store_true",
                        help="Reduce frame rate to 30fps for smaller file size")
+    parser.add_argument("--plan", action="store_true",
+                       help="Choose resolution, fps and bitrate from sample encodes instead of fixed rules")
+    parser.add_argument("--complexity", action="store_true",
+                       help="Measure motion and detail over time and give complex scenes more of the bitrate "
+                            "(segments the encode; needs numpy)")
+    parser.add_argument("-j", "--segments", type=int, nargs="?", const=0,
+                       help="Encode N keyframe-aligned segments in parallel (no N: one per 4 cores)")
+    parser.add_argument("--copy-audio", action="store_true",
+                       help="With --segments: keep the original audio instead of re-encoding it to AAC")
+    parser.add_argument("--compare-single", action="store_true",
+                       help="With --segments: also time a single-process encode and report the speedup")
+    parser.add_argument("--progress-log", metavar="JSONL",
+                       help="Append encode progress (fps, speed, bitrate, ETA) to this file as JSON lines")
+    parser.add_argument("--probe-cache", metavar="PATH",
+                       help="ffprobe cache file (default: $FFPROBE_CACHE or ~/.cache/utility-scripts/ffprobe.sqlite)")
 
     args = parser.parse_args()
+    if args.probe_cache:
+        use_cache(args.probe_cache)
     
     if args.analyze:
-        analyze_video_only(args.input)
+        analyze_video_only(args.input, args.size, use_hevc=args.hevc, complexity=args.complexity)
     else:
         compress_video_to_size(
             args.input, 
@@ -268,7 +412,13 @@ def main():
             args.size,
             downscale_to_1080p=getattr(args, '1080p'),
             use_hevc=args.hevc,
-            reduce_fps=getattr(args, '30fps')
+            reduce_fps=getattr(args, '30fps'),
+            segments=default_segments() if args.segments == 0 else args.segments,
+            copy_audio=args.copy_audio,
+            compare_single=args.compare_single,
+            plan=args.plan,
+            progress_log=args.progress_log,
+            complexity=args.complexity
         )
 
 if __name__ == "__main__":
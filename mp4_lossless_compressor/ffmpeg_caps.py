@@ -0,0 +1,131 @@
+"""What the installed ffmpeg can do, detected once.
+
+The binary is found on PATH, and its version, encoders, muxers and filters
+are read from `ffmpeg -version/-encoders/-muxers/-filters`. The result is
+kept for the life of the process and on disk keyed by the binary's path,
+size and mtime, so later processes only pay for a stat until ffmpeg is
+upgraded. Callers check the encoders a job needs before starting it.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from collections import namedtuple
+
+
+DEFAULT_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                            'utility-scripts', 'ffmpeg_caps.json')
+
+INSTALL_HINT = (
+    "FFmpeg is not installed or not found in the system PATH. "
+    "Please install FFmpeg and ensure it's accessible. "
+    "Download from: https://ffmpeg.org/download.html"
+)
+
+Capabilities = namedtuple('Capabilities', 'ffmpeg ffprobe version encoders muxers filters')
+
+_encoder_line = re.compile(r'^ [VAS][.F][.S][.X][.B][.D] (\S+)')
+_muxer_line = re.compile(r'^ [D ]E[d ]? +(\S+)')
+_filter_line = re.compile(r'^ [T.][S.][C.] (\S+) +\S*->\S*')
+
+_detected = {}
+_lock = threading.Lock()
+
+
+def _names(text, pattern):
+    names = set()
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if match:
+            names.update(match.group(1).split(','))
+    return names
+
+
+def _query(ffmpeg, flag):
+    return subprocess.run([ffmpeg, '-hide_banner', flag], stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, check=True).stdout.decode('utf-8', errors='replace')
+
+
+def _detect(ffmpeg):
+    version_text = _query(ffmpeg, '-version')
+    version = version_text.split('\n', 1)[0].split(' ')[2] if version_text.startswith('ffmpeg version') else None
+    return {
+        'ffmpeg': ffmpeg,
+        'ffprobe': shutil.which('ffprobe', path=os.path.dirname(ffmpeg)) or shutil.which('ffprobe'),
+        'version': version,
+        'encoders': sorted(_names(_query(ffmpeg, '-encoders'), _encoder_line)),
+        'muxers': sorted(_names(_query(ffmpeg, '-muxers'), _muxer_line)),
+        'filters': sorted(_names(_query(ffmpeg, '-filters'), _filter_line)),
+    }
+
+
+def _load(cache_path):
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _store(cache_path, entries):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        partial = cache_path + '.partial'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(partial, cache_path)
+    except OSError:
+        pass  # a read-only home only costs the detection next time
+
+
+def capabilities(ffmpeg='ffmpeg', cache_path=None):
+    """Capabilities of the ffmpeg binary found for `ffmpeg` (a name on PATH or a path).
+
+    raises -> EnvironmentError: if there is no such binary or it doesn't run.
+    """
+    binary = shutil.which(ffmpeg)
+    if binary is None:
+        raise EnvironmentError(INSTALL_HINT)
+    binary = os.path.realpath(binary)
+    stat = os.stat(binary)
+    key = f'{binary}|{stat.st_size}|{stat.st_mtime_ns}'
+
+    with _lock:
+        if key in _detected:
+            return _detected[key]
+        cache_path = cache_path or os.environ.get('FFMPEG_CAPS_CACHE') or DEFAULT_PATH
+        entries = _load(cache_path)
+        data = entries.get(key)
+        if data is None:
+            try:
+                data = _detect(binary)
+            except (OSError, subprocess.CalledProcessError) as e:
+                raise EnvironmentError(f'{INSTALL_HINT} ({binary}: {e})') from e
+            # entries for older builds of the same binary are dropped
+            entries = {k: v for k, v in entries.items() if not k.startswith(binary + '|')}
+            entries[key] = data
+            _store(cache_path, entries)
+        caps = Capabilities(data['ffmpeg'], data['ffprobe'], data['version'],
+                            frozenset(data['encoders']), frozenset(data['muxers']),
+                            frozenset(data['filters']))
+        _detected[key] = caps
+        return caps
+
+
+def require(encoders=(), muxers=(), filters=(), ffmpeg='ffmpeg'):
+    """Check that ffmpeg has everything a job needs before it starts.
+
+    raises -> EnvironmentError: naming whatever is missing.
+    """
+    caps = capabilities(ffmpeg)
+    missing = [f'encoder {name}' for name in encoders if name not in caps.encoders] \
+        + [f'muxer {name}' for name in muxers if name not in caps.muxers] \
+        + [f'filter {name}' for name in filters if name not in caps.filters]
+    if missing:
+        raise EnvironmentError(
+            f"ffmpeg {caps.version} at {caps.ffmpeg} lacks {', '.join(missing)}. "
+            "Install a build that includes them (see https://ffmpeg.org/download.html)."
+        )
+    return caps
@@ -0,0 +1,175 @@
+"""Pick encoding settings for a target size from a few short sample encodes.
+
+Instead of guessing (a bitrate cap for 1080p, a flat discount for HEVC)
+and finding out after the full encode, a handful of seconds spread over
+the file is encoded for every candidate resolution and frame rate:
+
+* once at the bitrate the target size allows, scoring its SSIM against
+  the source (scaled back to the source size, so candidates compare), and
+* once at a near-transparent CRF, to learn how many bits the content needs
+  at all; if that is less than the budget there's no point spending more.
+
+The candidate with the best predicted quality wins, and its size is
+extrapolated from the sample bitrates.
+"""
+import os
+import re
+import tempfile
+import time
+from collections import namedtuple
+
+
+# near-transparent CRF per encoder, used to measure what the content needs
+TRANSPARENT_CRF = {'libx264': 20, 'libx265': 22}
+# fraction of the file's duration all sample encodes together may cover;
+# samples use the real preset, so this is also roughly their share of time
+PLAN_BUDGET = 0.03
+SAMPLES = 5
+MIN_SAMPLE_SECONDS = 1.0
+MAX_SAMPLE_SECONDS = 4.0
+AUDIO_KBPS = 128
+
+Candidate = namedtuple('Candidate', 'name vf fps')
+Prediction = namedtuple('Prediction', 'candidate bitrate_kbps size_gb ssim needed_kbps')
+
+_ssim_all = re.compile(r'SSIM .*All:([\d.]+)')
+
+
+def candidates(video_info, downscale_to_1080p=None, reduce_fps=None):
+    """Resolution/frame-rate combinations worth trying for this video.
+
+    downscale_to_1080p and reduce_fps force an option on (True) or off
+    (False); None lets the planner try both where they apply.
+    """
+    is_above_1080p = video_info['width'] > 1920 or video_info['height'] > 1080
+    is_high_fps = video_info['fps'] > 30
+    scales = [False, True] if downscale_to_1080p is None else [downscale_to_1080p]
+    rates = [False, True] if reduce_fps is None else [reduce_fps]
+    result = []
+    for scale in scales:
+        if scale and not is_above_1080p and downscale_to_1080p is None:
+            continue
+        for rate in rates:
+            if rate and not is_high_fps and reduce_fps is None:
+                continue
+            name = ' '.join(filter(None, [
+                '1080p' if scale else f"{video_info['width']}x{video_info['height']}",
+                '30fps' if rate else f"{video_info['fps']:.0f}fps",
+            ]))
+            result.append(Candidate(name, 'scale=1920:1080' if scale else None,
+                                    '30' if rate else None))
+    return result
+
+
+def sample_offsets(duration, samples, sample_seconds):
+    """Start times of samples spread evenly, away from the very start and end."""
+    step = duration / (samples + 1)
+    return [max(0.0, step * (i + 1) - sample_seconds / 2) for i in range(samples)]
+
+
+def _encode_sample(input_path, offset, seconds, output, vcodec, candidate, rate_params):
+    import ffmpeg
+    params = dict(rate_params)
+    if candidate.vf:
+        params['vf'] = candidate.vf
+    if candidate.fps:
+        params['r'] = candidate.fps
+    (
+        ffmpeg
+        .input(input_path, ss=f'{offset:.3f}', t=f'{seconds:.3f}')
+        .output(output, vcodec=vcodec, preset='medium', an=None, **params)
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    return os.path.getsize(output) * 8 / seconds / 1000
+
+
+def _sample_ssim(input_path, offset, seconds, sample, video_info, candidate):
+    import ffmpeg
+    reference = ffmpeg.input(input_path, ss=f'{offset:.3f}', t=f'{seconds:.3f}').video
+    encoded = ffmpeg.input(sample).video
+    if candidate.fps:
+        reference = reference.filter('fps', candidate.fps)
+    encoded = encoded.filter('scale', video_info['width'], video_info['height'])
+    _, stderr = (
+        ffmpeg
+        .filter([encoded, reference], 'ssim')
+        .output('-', f='null')
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    match = _ssim_all.search(stderr.decode('utf-8', errors='replace'))
+    return float(match.group(1)) if match else None
+
+
+def plan_encode(input_path, video_info, target_bitrate_kbps, vcodec='libx264',
+                downscale_to_1080p=None, reduce_fps=None, samples=SAMPLES, budget=PLAN_BUDGET):
+    """Predict size and quality of every candidate from sample encodes.
+
+    :param target_bitrate_kbps: Video bitrate the target size allows.
+
+    A Prediction's bitrate_kbps and size_gb are extrapolated from the
+    bitrates the samples came out at; encode at
+    min(target_bitrate_kbps, needed_kbps) to get them.
+
+    returns -> (list, dict): one Prediction per candidate, best first, and
+               {'sample_seconds', 'samples', 'seconds'} describing the run.
+    """
+    started = time.perf_counter()
+    duration = video_info['duration']
+    options = candidates(video_info, downscale_to_1080p, reduce_fps)
+    encodes_per_sample = 2 * len(options)
+    # short files get fewer samples before samples get too short to say much
+    samples = max(1, min(samples, int(duration * budget / (encodes_per_sample * MIN_SAMPLE_SECONDS))))
+    sample_seconds = min(MAX_SAMPLE_SECONDS,
+                         max(MIN_SAMPLE_SECONDS, duration * budget / (encodes_per_sample * samples)))
+    if sample_seconds * samples > duration:
+        samples, sample_seconds = 1, duration
+    offsets = sample_offsets(duration, samples, sample_seconds)
+    transparent = {'crf': TRANSPARENT_CRF.get(vcodec, 20)}
+    at_target = {'video_bitrate': f'{target_bitrate_kbps}k'}
+
+    predictions = []
+    with tempfile.TemporaryDirectory(prefix='plan-') as tmp:
+        for candidate in options:
+            needed, achieved, scores = [], [], []
+            for i, offset in enumerate(offsets):
+                sample = os.path.join(tmp, f'sample_{i}.mkv')
+                needed.append(_encode_sample(input_path, offset, sample_seconds, sample,
+                                             vcodec, candidate, transparent))
+                if needed[-1] <= target_bitrate_kbps:
+                    # the budget is more than this content needs
+                    achieved.append(needed[-1])
+                else:
+                    achieved.append(_encode_sample(input_path, offset, sample_seconds, sample,
+                                                   vcodec, candidate, at_target))
+                scores.append(_sample_ssim(input_path, offset, sample_seconds, sample,
+                                           video_info, candidate))
+            needed_kbps = int(sum(needed) / len(needed))
+            # what the encoder actually delivered, rate control misses included
+            bitrate_kbps = int(sum(achieved) / len(achieved))
+            size_gb = (bitrate_kbps + AUDIO_KBPS) * 1000 * duration / 8 / (1024 ** 3)
+            scores = [s for s in scores if s is not None]
+            ssim = sum(scores) / len(scores) if scores else None
+            predictions.append(Prediction(candidate, bitrate_kbps, size_gb, ssim, needed_kbps))
+
+    # best quality first; on a tie keep the less lossy option (earlier in the list)
+    predictions.sort(key=lambda p: -(p.ssim or 0))
+    return predictions, {
+        'samples': samples,
+        'sample_seconds': sample_seconds,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def print_plan(predictions, run, target_size_gb):
+    """Print the predictions table, best first."""
+    print(f"\n🔮 SIZE PREDICTION ({run['samples']} samples of {run['sample_seconds']:.1f}s per candidate, "
+          f"planned in {run['seconds']:.1f}s)")
+    print(f"   {'candidate':<20}{'kbps':>8}{'needs kbps':>12}{'size GB':>10}{'SSIM':>8}")
+    for prediction in predictions:
+        ssim = f'{prediction.ssim:.4f}' if prediction.ssim is not None else '   n/a'
+        fits = '✅' if prediction.size_gb <= target_size_gb else '⚠️ '
+        print(f"   {prediction.candidate.name:<20}{prediction.bitrate_kbps:>8}"
+              f"{prediction.needed_kbps:>12}{prediction.size_gb:>10.3f}{ssim:>8} {fits}")
+    best = predictions[0]
+    print(f"   → Best for {target_size_gb} GB: {best.candidate.name}, predicted {best.bitrate_kbps} kbps")
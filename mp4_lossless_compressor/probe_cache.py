@@ -0,0 +1,161 @@
+"""Persistent cache of ffprobe results.
+
+Probing a file means starting ffprobe and parsing its JSON, which adds up
+when the same files are probed again and again. Results are stored in
+SQLite keyed by (path, size, mtime, inode), so a changed file is probed
+again, and the least recently used entries are evicted past a limit.
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                            'utility-scripts', 'ffprobe.sqlite')
+MAX_ENTRIES = 50_000
+MEMORY_ENTRIES = 1024
+
+
+class ProbeError(RuntimeError):
+    """ffprobe could not read a file."""
+
+    def __init__(self, path, stderr):
+        super().__init__(f"ffprobe failed on {path}: {stderr.strip()}")
+        self.path = path
+        self.stderr = stderr
+
+
+def run_ffprobe(path, ffprobe='ffprobe'):
+    """Probe a file the way ffmpeg.probe does and return the parsed JSON."""
+    result = subprocess.run(
+        [ffprobe, '-show_format', '-show_streams', '-of', 'json', path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise ProbeError(path, result.stderr.decode('utf-8', errors='replace'))
+    return json.loads(result.stdout.decode('utf-8'))
+
+
+class ProbeCache:
+    """ffprobe results on disk, with a small in-memory layer in front.
+
+    Safe to share between threads. Failed probes are not cached.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=MAX_ENTRIES, prober=run_ffprobe):
+        self.path = path
+        self.max_entries = max_entries
+        self.prober = prober
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS probes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                probe TEXT NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS probes_last_access ON probes (last_access);
+        ''')
+
+    def probe(self, path):
+        """Return ffprobe's output for path as a dict, probing only if the
+        file is new to the cache or changed since it was stored."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        with self._lock:
+            cached = self._memory.get(path)
+            if cached is not None and cached[0] == key:
+                self._memory.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+
+            row = self._db.execute('SELECT size, mtime_ns, inode, probe FROM probes WHERE path = ?',
+                                   (path,)).fetchone()
+            if row is not None and tuple(row[:3]) == key:
+                self._db.execute('UPDATE probes SET last_access = ? WHERE path = ?',
+                                 (time.time(), path))
+                self._db.commit()
+                self.hits += 1
+                result = json.loads(row[3])
+                self._remember(path, key, result)
+                return result
+
+        # probe outside the lock so threads probing different files overlap
+        result = self.prober(path)
+        with self._lock:
+            self.misses += 1
+            self._db.execute('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)',
+                             (path, *key, json.dumps(result), time.time()))
+            self._evict()
+            self._db.commit()
+            self._remember(path, key, result)
+        return result
+
+    def _remember(self, path, key, result):
+        self._memory[path] = (key, result)
+        self._memory.move_to_end(path)
+        if len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        count = self._db.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                'DELETE FROM probes WHERE path IN '
+                '(SELECT path FROM probes ORDER BY last_access LIMIT ?)',
+                (count - self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """The process-wide cache, at $FFPROBE_CACHE or DEFAULT_PATH."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ProbeCache(os.environ.get('FFPROBE_CACHE') or DEFAULT_PATH)
+        return _default_cache
+
+
+def use_cache(path):
+    """Point the process-wide cache at another file (':memory:' keeps
+    it for this process only)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is not None:
+            _default_cache.close()
+        _default_cache = ProbeCache(path)
+        return _default_cache
+
+
+def probe(path):
+    """ffprobe's output for path, through the process-wide cache."""
+    return default_cache().probe(path)
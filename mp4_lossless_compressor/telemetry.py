@@ -0,0 +1,138 @@
+"""Live progress of ffmpeg runs from its machine-readable -progress output.
+
+ffmpeg is started with `-progress pipe:1 -nostats`, which makes it write
+a block of key=value lines to stdout about twice a second. Every block is
+turned into a Progress and handed to a callback and/or appended to a JSON
+lines file as it arrives. stderr is drained on a thread into a ring
+buffer, so memory stays bounded however long the encode runs and the last
+lines are still there to explain a failure.
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+
+STDERR_LINES = 200
+
+Progress = namedtuple('Progress', 'frame fps bitrate_kbps total_size out_time speed percent eta done')
+
+
+def _number(value, suffix=''):
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:  # 'N/A' before the first frame is out
+        return None
+
+
+def parse_progress(block, duration=None):
+    """Turn one -progress block (a dict of its key=value lines) into a Progress.
+
+    percent and eta (seconds) need the input duration; fields ffmpeg
+    reports as N/A are None.
+    """
+    out_time = _number(block.get('out_time_us'))
+    out_time = out_time / 1_000_000 if out_time is not None else None
+    speed = _number(block.get('speed'), 'x')
+    percent = eta = None
+    if duration and out_time is not None:
+        percent = min(100.0, max(0.0, out_time / duration * 100))
+        if speed:
+            eta = max(0.0, (duration - out_time) / speed)
+    done = block.get('progress') == 'end'
+    if done and duration:
+        percent, eta = 100.0, 0.0
+    frame = _number(block.get('frame'))
+    total_size = _number(block.get('total_size'))
+    return Progress(
+        frame=int(frame) if frame is not None else None,
+        fps=_number(block.get('fps')),
+        bitrate_kbps=_number(block.get('bitrate'), 'kbits/s'),
+        total_size=int(total_size) if total_size is not None else None,
+        out_time=out_time,
+        speed=speed,
+        percent=percent,
+        eta=eta,
+        done=done,
+    )
+
+
+def console_progress(progress, file=sys.stderr):
+    """A progress callback that keeps one status line up to date."""
+    parts = []
+    if progress.percent is not None:
+        parts.append(f'{progress.percent:5.1f}%')
+    if progress.out_time is not None:
+        parts.append(f'{progress.out_time:8.1f}s')
+    if progress.fps is not None:
+        parts.append(f'{progress.fps:6.1f} fps')
+    if progress.speed is not None:
+        parts.append(f'{progress.speed:5.2f}x')
+    if progress.bitrate_kbps is not None:
+        parts.append(f'{progress.bitrate_kbps:8.0f} kbps')
+    if progress.eta is not None:
+        minutes, seconds = divmod(int(progress.eta), 60)
+        parts.append(f'ETA {minutes}:{seconds:02d}')
+    print('\r⏳ ' + '  '.join(parts) + ' ', end='\n' if progress.done else '', file=file, flush=True)
+
+
+def run_ffmpeg(command, duration=None, on_progress=None, log_path=None, stderr_lines=STDERR_LINES):
+    """Run an ffmpeg command list and report its progress as it goes.
+
+    :param command: Full command, starting with the ffmpeg binary.
+    :param duration: Seconds of input, for percent and ETA.
+    :param on_progress: Called with a Progress for every block.
+    :param log_path: Append every Progress as a JSON line here, with the
+                     wall time and the output file (the command's last
+                     item apart from -y/-n).
+    :param stderr_lines: How many of ffmpeg's last stderr lines to keep.
+
+    returns -> Progress: the last one reported (None if there was none).
+    raises -> subprocess.CalledProcessError: on failure, with the kept
+              stderr lines as its stderr.
+    """
+    command = [command[0], '-progress', 'pipe:1', '-nostats'] + list(command[1:])
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, errors='replace', bufsize=1)
+    tail = deque(maxlen=stderr_lines)
+    drain = threading.Thread(target=lambda: tail.extend(line.rstrip('\n') for line in process.stderr),
+                             daemon=True)
+    drain.start()
+
+    output = next((arg for arg in reversed(command) if arg not in ('-y', '-n')), None)
+    log = open(log_path, 'a', encoding='utf-8') if log_path else None
+    last = None
+    block = {}
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            if key != 'progress':
+                continue
+            last = parse_progress(block, duration)
+            block = {}
+            if on_progress is not None:
+                on_progress(last)
+            if log is not None:
+                log.write(json.dumps({'time': time.time(), 'output': output, **last._asdict()}) + '\n')
+                log.flush()
+        returncode = process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        drain.join()
+        if log is not None:
+            log.close()
+
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command, stderr='\n'.join(tail))
+    return last
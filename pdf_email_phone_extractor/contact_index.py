@@ -0,0 +1,85 @@
+import csv
+import json
+import re
+from array import array
+
+
+_non_digits = re.compile(r'\D')
+
+
+def normalize_phone(phone):
+    """Canonical form of a phone match: its digits only."""
+    return _non_digits.sub('', phone)
+
+
+def normalize_email(email):
+    """Canonical form of an email match: trimmed and lower-cased."""
+    return email.strip().lower()
+
+
+class ContactIndex:
+    """Deduplicated contacts per state, with the PDFs each one came from.
+
+    Source paths are stored once and referred to by number, and each
+    contact keeps a compact array of those numbers, so memory grows with
+    the number of distinct contacts rather than the number of matches.
+    """
+
+    def __init__(self):
+        self._sources = []
+        self._source_ids = {}
+        self._states = {}
+
+    def _source_id(self, path):
+        source_id = self._source_ids.get(path)
+        if source_id is None:
+            source_id = self._source_ids[path] = len(self._sources)
+            self._sources.append(path)
+        return source_id
+
+    def add(self, state, path, phones, emails):
+        """Index the raw phone and email matches of one PDF."""
+        contacts = self._states.setdefault(state, {})
+        source_id = self._source_id(path)
+        for kind, values in (('phone', {normalize_phone(p) for p in phones}),
+                             ('email', {normalize_email(e) for e in emails})):
+            for value in values:
+                if not value:
+                    continue
+                key = (kind, value)
+                sources = contacts.get(key)
+                if sources is None:
+                    contacts[key] = array('I', (source_id,))
+                elif sources[-1] != source_id:
+                    sources.append(source_id)
+
+    def __len__(self):
+        return sum(len(contacts) for contacts in self._states.values())
+
+    def rows(self, state):
+        """Yield (type, contact, source paths) for a state, sorted by contact."""
+        contacts = self._states.get(state, {})
+        for (kind, value) in sorted(contacts):
+            yield kind, value, sorted(self._sources[i] for i in contacts[(kind, value)])
+
+    def export(self, output_path, fmt='csv'):
+        """Write one `output_path + state + '_contacts.<fmt>'` file per state.
+
+        returns -> list: the files written.
+        """
+        written = []
+        for state in sorted(self._states):
+            path = '{}{}_contacts.{}'.format(output_path, state, fmt)
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                if fmt == 'csv':
+                    writer = csv.writer(f)
+                    writer.writerow(['type', 'contact', 'pdf_count', 'pdfs'])
+                    for kind, value, sources in self.rows(state):
+                        writer.writerow([kind, value, len(sources), ';'.join(sources)])
+                elif fmt == 'jsonl':
+                    for kind, value, sources in self.rows(state):
+                        f.write(json.dumps({'type': kind, 'contact': value, 'pdfs': sources}) + '\n')
+                else:
+                    raise ValueError('Unknown index format: {}'.format(fmt))
+            written.append(path)
+        return written
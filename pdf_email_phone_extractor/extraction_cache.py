@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class ExtractionCache:
+    """SQLite record of every PDF already processed, keyed by content hash.
+
+    A second table remembers (size, mtime) per path so unchanged files are
+    not re-read just to be hashed again, and a third which content of each
+    path already had its line written out. Each result is committed as
+    soon as it is recorded, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                line TEXT,
+                phones TEXT,
+                emails TEXT,
+                error TEXT,
+                pages INTEGER,
+                seconds REAL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS written (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL
+            );
+        ''')
+
+    def file_hash(self, path):
+        """Return the sha256 of path, reusing the stored one if size and mtime match."""
+        stat = os.stat(path)
+        row = self._db.execute('SELECT size, mtime_ns, sha256 FROM files WHERE path = ?',
+                               (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        self._db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                         (path, stat.st_size, stat.st_mtime_ns, sha256))
+        return sha256
+
+    def get(self, sha256):
+        """Return the stored result for a content hash as a dict, or None."""
+        row = self._db.execute(
+            'SELECT path, status, line, phones, emails, error, pages, seconds FROM results '
+            'WHERE sha256 = ?', (sha256,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'path': row[0],
+            'status': row[1],
+            'line': row[2],
+            'phones': json.loads(row[3]) if row[3] else [],
+            'emails': json.loads(row[4]) if row[4] else [],
+            'error': row[5],
+            'pages': row[6],
+            'seconds': row[7],
+        }
+
+    def is_written(self, path, sha256):
+        """Whether this content of path already had its output line written."""
+        row = self._db.execute('SELECT sha256 FROM written WHERE path = ?', (path,)).fetchone()
+        return row is not None and row[0] == sha256
+
+    def mark_written(self, path, sha256):
+        """Remember that path's output line was written, and commit."""
+        self._db.execute('INSERT OR REPLACE INTO written VALUES (?, ?)', (path, sha256))
+        self._db.commit()
+
+    def record(self, sha256, path, extraction):
+        """Store an Extraction for a content hash and commit it."""
+        status = 'failed' if extraction.error else 'ok'
+        self._db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (sha256, path, status, extraction.line,
+             json.dumps(extraction.phones), json.dumps(extraction.emails),
+             extraction.error, len(extraction.page_seconds),
+             sum(extraction.page_seconds), time.time()))
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
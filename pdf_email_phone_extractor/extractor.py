@@ -1,62 +1,308 @@
+import argparse
+import collections
+import csv
+import heapq
 import os
 import re
-import PyPDF2
 import sys
 import shutil
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
 
+try:
+    from .contact_index import ContactIndex
+    from .extraction_cache import ExtractionCache
+except ImportError:
+    from contact_index import ContactIndex
+    from extraction_cache import ExtractionCache
 
-def pdf_extractor():
 
-    email_regex = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]{3}')
-    phone_regex = re.compile (r'([-\.\s]??\d{3}[-\.\s]??\d{3}[-\.\s]??\d{5}|\(\d{3}\)\s*\d{3}[-\.\s]??\d{5}|\d{3}[-\.\s]??\d{5})')
-    
-    target_file_path = sys.argv[1]
+email_regex = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]{3}')
+phone_regex = re.compile (r'([-\.\s]??\d{3}[-\.\s]??\d{3}[-\.\s]??\d{5}|\(\d{3}\)\s*\d{3}[-\.\s]??\d{5}|\d{3}[-\.\s]??\d{5})')
+
+# Characters of the previous page kept when scanning the next one, so
+# contacts split across a page break are still found. Must be at least as
+# long as the longest contact we expect to match.
+SCAN_OVERLAP = 256
+
+CACHE_NAME = 'extraction_cache.sqlite'
+FAILURES_NAME = 'failed_pdfs.csv'
+
+Extraction = collections.namedtuple('Extraction', 'line phones emails page_seconds error')
+
+
+def pdf_extractor(target_file_path=None, output_path=None, workers=None, ordered=True,
+                  timings_path=None, cache_path=None, retry_failed=False, keep_input=False,
+                  index_format=None):
+    """Extract emails and phone numbers from every PDF under target_file_path.
+
+    PDFs are parsed in a process pool; each state's results are written by a
+    single writer to `output_path + state + '.txt'`. Every result is stored
+    in a cache keyed by the PDF's content hash, so re-runs only parse new or
+    changed files and an interrupted run picks up where it stopped. PDFs
+    that fail are listed in `output_path + 'failed_pdfs.csv'`.
+
+    :param target_file_path: Folder of state folders (defaults to sys.argv[1]).
+    :param output_path: Prefix for the per-state output files (defaults to sys.argv[2]).
+    :param workers: Number of parsing processes (defaults to the CPU count).
+                    1 parses in this process, without starting a pool.
+    :param ordered: Write each state's lines in file order; when False lines
+                    are written as soon as their PDF finishes.
+    :param timings_path: Optional CSV receiving (file, page, seconds) for
+                         every page, followed by a printout of the slowest PDFs.
+    :param cache_path: SQLite cache file (defaults to
+                       `output_path + 'extraction_cache.sqlite'`).
+    :param retry_failed: Parse PDFs again even if they failed last time.
+    :param keep_input: Never empty target_file_path. It is only emptied
+                       anyway when every PDF was extracted successfully.
+    :param index_format: 'csv' or 'jsonl' to also export a deduplicated,
+                         normalized contact index per state to
+                         `output_path + state + '_contacts.<format>'`.
+    """
+    if target_file_path is None:
+        target_file_path = sys.argv[1]
+    if output_path is None:
+        output_path = sys.argv[2] if len(sys.argv) > 2 else ''
+    if cache_path is None:
+        cache_path = output_path + CACHE_NAME
 
     pdf_files = list_of_files(target_file_path)
-    keys = pdf_files.keys()
-
-    for key in keys:
-        print(key + '...')
-        for pdf_file in pdf_files[key]:
-            try:
-                with open(pdf_file, 'rb') as pdf_obj:
-                    pdf_reader = PyPDF2.PdfFileReader(pdf_obj)
-                    
-                    pdf_obj = ''
-                    count = pdf_reader.numPages
-                    for i in range(count):
-                        pdf_obj += str(pdf_reader.getPage(i).extractText())
-                        
-                    phone = str(phone_regex.findall(pdf_obj))\
-                            .replace('[', '').replace(']', '')\
-                            .replace(' ', '')\
-                            .strip("'")\
-                            .replace(',', ' ')\
-
-                    email = str(email_regex.findall(pdf_obj))\
-                            .replace('[', '')\
-                            .replace(']', '')\
-                            .strip("'")
-
-                    with open(sys.argv[2] + key + '.txt', 'a+', encoding="utf-8") as extracts:
-                        details = '{}, {}\n'.format(phone.strip("'") if len(phone) > 0 else '', email if len(email) > 0 else '')
-                        contact = details.strip("'")
-                        extracts.write(contact.strip("'"))
-            except Exception as e:
-                pass
-
-    empty_folder(target_file_path)
+    cache = ExtractionCache(cache_path)
+    writers = {}
+    contacts = ContactIndex() if index_format else None
+    failures = []
+    skipped = 0
+    timings = None
+    slowest = []
+
+    try:
+        if timings_path:
+            timings_file = open(timings_path, 'w', newline='', encoding='utf-8')
+            timings = csv.writer(timings_file)
+            timings.writerow(['file', 'page', 'seconds'])
+        with InlineExecutor() if workers == 1 else ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for key, files in pdf_files.items():
+                print(key + '...')
+                writers[key] = StateWriter(output_path + key + '.txt', ordered)
+                for index, pdf_file in enumerate(files):
+                    sha256 = cache.file_hash(pdf_file)
+                    cached = cache.get(sha256)
+                    if cached and (cached['status'] == 'ok' or not retry_failed):
+                        skipped += 1
+                        if contacts is not None:
+                            contacts.add(key, pdf_file, cached['phones'], cached['emails'])
+                        if cached['status'] == 'failed':
+                            failures.append((pdf_file, cached['error']))
+                        if cache.is_written(pdf_file, sha256):
+                            writers[key].add(index, None)
+                        else:
+                            # parsed before but its line never made it out (a
+                            # copy of another PDF, or an interrupted run)
+                            writers[key].add(index, cached['line'],
+                                             lambda f=pdf_file, h=sha256: cache.mark_written(f, h))
+                        continue
+                    future = pool.submit(extract_contacts, pdf_file)
+                    futures[future] = (key, index, sha256)
+
+            for future in as_completed(futures):
+                key, index, sha256 = futures[future]
+                pdf_file = pdf_files[key][index]
+                extraction = future.result()
+                cache.record(sha256, pdf_file, extraction)
+                writers[key].add(index, extraction.line,
+                                 lambda f=pdf_file, h=sha256: cache.mark_written(f, h))
+                if extraction.error:
+                    failures.append((pdf_file, extraction.error))
+                if contacts is not None:
+                    contacts.add(key, pdf_file, extraction.phones, extraction.emails)
+                if timings is not None:
+                    page_seconds = extraction.page_seconds
+                    timings.writerows((pdf_file, page, f'{seconds:.4f}')
+                                      for page, seconds in enumerate(page_seconds, 1))
+                    heapq.heappush(slowest, (sum(page_seconds), len(page_seconds), pdf_file))
+                    if len(slowest) > 10:
+                        heapq.heappop(slowest)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        cache.close()
+        if timings is not None:
+            timings_file.close()
+
+    if timings is not None:
+        print('Slowest PDFs:')
+        for seconds, pages, pdf_file in sorted(slowest, reverse=True):
+            print('  {:.2f}s  {} pages  {}'.format(seconds, pages, pdf_file))
+
+    if contacts is not None:
+        contacts.export(output_path, index_format)
+        print('{} distinct contacts indexed.'.format(len(contacts)))
+
+    if skipped:
+        print('{} PDFs already processed, skipped.'.format(skipped))
+
+    if failures:
+        failures.sort()
+        with open(output_path + FAILURES_NAME, 'w', newline='', encoding='utf-8') as report:
+            report_writer = csv.writer(report)
+            report_writer.writerow(['file', 'error'])
+            report_writer.writerows(failures)
+        print('{} PDFs failed, see {}. Input folder was kept.'.format(
+            len(failures), output_path + FAILURES_NAME))
+    elif not keep_input:
+        empty_folder(target_file_path)
 
     print('Action was successful')
     return
 
 
+def extract_contacts(pdf_file):
+    """Scan one PDF for contacts.
+
+    returns -> Extraction: the "phones, emails" output line (None if the PDF
+               can't be read), the raw matches, seconds spent extracting
+               each page and the error message of a failed PDF.
+    """
+    import PyPDF2  # only the worker processes need it
+
+    page_seconds = []
+    try:
+        with open(pdf_file, 'rb') as pdf_obj:
+            pdf_reader = PyPDF2.PdfFileReader(pdf_obj)
+            phones, emails = scan_texts(_page_texts(pdf_reader, page_seconds),
+                                        (phone_regex, email_regex))
+        return Extraction(format_contacts(phones, emails), phones, emails, page_seconds, None)
+    except Exception as e:
+        return Extraction(None, [], [], page_seconds, '{}: {}'.format(type(e).__name__, e))
+
+
+def _page_texts(pdf_reader, page_seconds):
+    """Yield each page's text, appending its extraction time to page_seconds."""
+    for i in range(pdf_reader.numPages):
+        started = time.perf_counter()
+        text = str(pdf_reader.getPage(i).extractText())
+        page_seconds.append(time.perf_counter() - started)
+        yield text
+
+
+def scan_texts(texts, patterns, overlap=SCAN_OVERLAP):
+    """Run every pattern over the concatenation of texts without building it.
+
+    Only the current text plus a tail of at most `overlap` characters (or
+    the start of a match that runs into that tail) is held at a time, so
+    the result equals pattern.findall(''.join(texts)) for matches no longer
+    than overlap.
+
+    returns -> list: one list of matches per pattern.
+    """
+    found = [[] for _ in patterns]
+    resume = [0] * len(patterns)  # where each pattern continues, relative to buffer
+    buffer = ''
+
+    def scan(final):
+        cut = len(buffer) if final else len(buffer) - overlap
+        for i, pattern in enumerate(patterns):
+            next_start = max(resume[i], cut)
+            for match in pattern.finditer(buffer, resume[i]):
+                if match.end() > cut:
+                    # anything from the cut on may still grow into a longer match
+                    next_start = min(match.start(), cut)
+                    break
+                found[i].append(match.group(1) if pattern.groups else match.group())
+            resume[i] = next_start
+
+    for text in texts:
+        buffer += text
+        if len(buffer) <= overlap:
+            continue
+        scan(final=False)
+        keep_from = min(resume)
+        buffer = buffer[keep_from:]
+        resume = [position - keep_from for position in resume]
+    scan(final=True)
+    return found
+
+
+def format_contacts(phones, emails):
+    """Format match lists as the "phones, emails" line written per PDF."""
+    phone = str(phones)\
+            .replace('[', '').replace(']', '')\
+            .replace(' ', '')\
+            .strip("'")\
+            .replace(',', ' ')\
+
+    email = str(emails)\
+            .replace('[', '')\
+            .replace(']', '')\
+            .strip("'")
+
+    details = '{}, {}\n'.format(phone.strip("'") if len(phone) > 0 else '', email if len(email) > 0 else '')
+    contact = details.strip("'")
+    return contact.strip("'")
+
+
+class InlineExecutor(Executor):
+    """Runs every submitted call right away in the calling process.
+
+    Saves starting worker processes (and importing PyPDF2 in them) when a
+    run is small, or when the caller is itself a long-lived worker.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class StateWriter:
+    """Owns one state's output file and appends result lines to it.
+
+    In ordered mode lines that finish early are held back until every
+    earlier PDF of the state has been written. An optional on_written
+    callback runs once a line is flushed to disk.
+    """
+
+    def __init__(self, path, ordered=True):
+        self.path = path
+        self.ordered = ordered
+        self._file = None
+        self._next = 0
+        self._held = {}
+
+    def add(self, index, line, on_written=None):
+        if not self.ordered:
+            self._write(line, on_written)
+            return
+        self._held[index] = (line, on_written)
+        while self._next in self._held:
+            self._write(*self._held.pop(self._next))
+            self._next += 1
+
+    def _write(self, line, on_written=None):
+        if line is not None:
+            if self._file is None:
+                self._file = open(self.path, 'a+', encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+        if on_written is not None:
+            on_written()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 def list_of_files(path_of_the_directory):
 
     pdf_files = {}
-    for state_name in os.listdir(path_of_the_directory):
+    for state_name in sorted(os.listdir(path_of_the_directory)):
         state = []
-        for file_name in os.listdir(path_of_the_directory + state_name):
+        for file_name in sorted(os.listdir(path_of_the_directory + state_name)):
             f = os.path.join(path_of_the_directory, state_name + '/' + file_name)
             if os.path.isfile(f):
                 state.append(f)
@@ -76,4 +322,33 @@ def empty_folder(folder):
         except Exception as e:
             print('Failed to delete %s. Reason: %s' % (file_path, e))
 
-pdf_extractor()
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract emails and phone numbers from PDFs")
+    parser.add_argument("target", help="Folder containing one sub-folder of PDFs per state (with trailing slash)")
+    parser.add_argument("output", nargs="?", default='',
+                        help="Prefix/folder for the per-state .txt files (with trailing slash)")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="Number of parsing processes (default: CPU count)")
+    parser.add_argument("--as-completed", action="store_true",
+                        help="Write lines as PDFs finish instead of in file order")
+    parser.add_argument("--timings", metavar="CSV",
+                        help="Write per-page extraction times to CSV and list the slowest PDFs")
+    parser.add_argument("--cache", metavar="SQLITE",
+                        help="Extraction cache file (default: <output>extraction_cache.sqlite)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Parse PDFs again that failed on a previous run")
+    parser.add_argument("--keep-input", action="store_true",
+                        help="Do not empty the target folder after a successful run")
+    parser.add_argument("--index", choices=("csv", "jsonl"),
+                        help="Also export deduplicated, normalized contacts per state")
+    args = parser.parse_args()
+
+    pdf_extractor(args.target, args.output, workers=args.workers, ordered=not args.as_completed,
+                  timings_path=args.timings, cache_path=args.cache,
+                  retry_failed=args.retry_failed, keep_input=args.keep_input,
+                  index_format=args.index)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""One entry point for every utility in this collection.
+
+    utility <command> [options]     run a tool (see `utility --help`)
+    utility import-budget           check each command's import time
+
+Nothing but the standard library is imported until a command is picked,
+and the tools themselves defer pandas, icalendar, ffmpeg-python and PyPDF2
+until the work that needs them, so `--help` and short runs start fast.
+"""
+import importlib
+import os
+import re
+import subprocess
+import sys
+
+
+# command -> (module, help)
+COMMANDS = {
+    'zip': ('zipper', 'Zip a directory (parallel, incremental, streaming)'),
+    'convert-video': ('video_format_converter', 'Convert a video to another container/format'),
+    'compress': ('mp4_lossless_compressor.compress_lossless', 'Compress a video to a target size'),
+    'encode-batch': ('encode_scheduler', 'Run many video encodes within a CPU budget'),
+    'ics': ('ics_to_xsls_converter.converter', 'Convert iCalendar files to spreadsheets'),
+    'pdf-extract': ('pdf_email_phone_extractor.extractor', 'Extract emails and phone numbers from PDFs'),
+    'service': ('utility_service', 'Keep the tools warm behind a Unix socket for many small jobs'),
+}
+
+# Milliseconds each command's module may take to import (cumulative, as
+# reported by `python -X importtime`). They are mostly standard library
+# today (40-80 ms on a slow disk); any of the heavy libraries below would
+# add 60-600 ms on its own.
+IMPORT_BUDGET_MS = {
+    'zip': 120,
+    'convert-video': 100,
+    'compress': 100,
+    'encode-batch': 100,
+    'ics': 120,
+    'pdf-extract': 120,
+    'service': 100,
+}
+
+# Libraries no command may import before it is actually run
+LAZY_MODULES = ('pandas', 'numpy', 'icalendar', 'recurring_ical_events', 'openpyxl',
+                'pyarrow', 'PyPDF2', 'ffmpeg')
+
+_importtime_line = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def usage():
+    lines = ['usage: utility <command> [options]',
+             '       utility import-budget [command ...]', '', 'commands:']
+    for name, (_, text) in COMMANDS.items():
+        lines.append(f'  {name:<16}{text}')
+    return '\n'.join(lines)
+
+
+def measure_import(module, python=sys.executable):
+    """Import `module` in a fresh interpreter under -X importtime.
+
+    returns -> (float, list): its cumulative import time in ms, and the
+               (ms, name) of every import it pulled in, slowest first.
+    """
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+    )
+    total = None
+    imports = []
+    for line in result.stderr.decode('utf-8', errors='replace').splitlines():
+        match = _importtime_line.match(line)
+        if not match:
+            continue
+        cumulative_ms, name = int(match.group(2)) / 1000, match.group(4)
+        imports.append((cumulative_ms, name))
+        if name == module and not match.group(3).strip():
+            total = cumulative_ms
+    # the module itself is reported last, once everything it imports is done
+    if total is None and imports:
+        total = imports[-1][0]
+    imports.sort(reverse=True)
+    return total, [(ms, name) for ms, name in imports if name != module]
+
+
+def check_import_budget(commands=None, repeat=3):
+    """Measure every command's import time against IMPORT_BUDGET_MS and
+    check that none of them loads a LAZY_MODULES library up front.
+
+    The best of `repeat` runs counts, to keep disk cache noise out.
+
+    returns -> bool: whether every command is within budget.
+    """
+    ok = True
+    print(f"{'command':<16}{'import ms':>10}{'budget':>8}  slowest imports")
+    for name in commands or COMMANDS:
+        module = COMMANDS[name][0]
+        runs = [measure_import(module) for _ in range(repeat)]
+        total, imports = min(runs, key=lambda run: run[0])
+        budget = IMPORT_BUDGET_MS[name]
+        eager = sorted({imported.split('.')[0] for _, imported in imports} & set(LAZY_MODULES))
+        over = total > budget or eager
+        ok = ok and not over
+        slowest = ', '.join(f'{imported} {ms:.0f}' for ms, imported in imports[:3])
+        print(f"{name:<16}{total:>10.1f}{budget:>8}{'  OVER' if over else '  ok  '}  {slowest}")
+        if eager:
+            print(f"{'':<36}loads {', '.join(eager)} at import time")
+    return ok
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+
+    command, args = argv[0], argv[1:]
+    if command == 'import-budget':
+        return 0 if check_import_budget(args or None) else 1
+    if command not in COMMANDS:
+        print(f"utility: unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    module = importlib.import_module(COMMANDS[command][0])
+    # the tools parse sys.argv themselves
+    sys.argv = [f'utility {command}'] + args
+    result = module.main()
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
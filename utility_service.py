@@ -0,0 +1,385 @@
+"""Run the utilities as a long-lived local service for many small jobs.
+
+    utility service serve [--socket PATH] [--workers N] [--queue N]
+    utility service submit ics ics_file_path=cal.ics excel_file_path=cal.csv
+    utility service metrics
+
+A fresh `utility ics ...` pays for the interpreter, pandas/icalendar/PyPDF2/
+ffmpeg-python imports and ffmpeg detection on every call. The service pays
+once: a pool of worker processes imports every tool's libraries and detects
+ffmpeg when it starts, then runs jobs sent over a Unix socket.
+
+Protocol: one JSON object per line, one reply line per request, in order.
+
+    {"tool": "<tool>", "args": {...}, "cwd": "/dir", "id": <any>}   run a job
+    {"op": "metrics"}                                            counters and latencies
+    {"op": "ping"}                                               round trip to a worker
+
+Tools are the functions behind the `utility` commands (see TOOLS); args are
+their keyword arguments. Relative paths among them (see PATH_ARGS) are taken
+relative to cwd, which request() fills in with the caller's directory.
+A reply is {"ok": true, "result": ..., "log": [...]} or
+{"ok": false, "error": "..."}, plus the id and queue_ms/run_ms/total_ms.
+
+At most workers + queue jobs are accepted at a time. A request beyond that
+waits up to --wait seconds for room and is then turned away with
+{"ok": false, "error": "busy"}, so callers slow down instead of piling up
+work the service can't keep up with.
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+
+
+DEFAULT_SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or os.path.expanduser('~/.cache/utility-scripts'),
+                              'utility.sock')
+QUEUE = 32
+WAIT_SECONDS = 5.0
+LATENCY_SAMPLES = 1000
+
+# tool -> (module, function, default keyword arguments)
+TOOLS = {
+    'zip': ('zipper', 'zip_directory', {}),
+    'convert-video': ('video_format_converter', 'convert_video', {}),
+    # no console progress line from a background process
+    'compress': ('mp4_lossless_compressor.compress_lossless', 'compress_video_to_size', {'on_progress': None}),
+    'ics': ('ics_to_xsls_converter.converter', 'ics_to_excel', {}),
+    # the worker is the pool: parse in it instead of starting processes per job
+    'pdf-extract': ('pdf_email_phone_extractor.extractor', 'pdf_extractor', {'workers': 1, 'keep_input': True}),
+}
+
+# arguments that arrive as JSON strings but the tool wants as objects
+CONVERTERS = {
+    'ics': {'start': datetime.datetime.fromisoformat, 'end': datetime.datetime.fromisoformat},
+}
+
+# arguments that are paths, made absolute against the client's directory
+PATH_ARGS = {
+    'zip': ('directory', 'zip_file'),
+    'convert-video': ('input_file', 'output_file', 'progress_log'),
+    'compress': ('input_path', 'output_path', 'progress_log'),
+    'ics': ('ics_file_path', 'excel_file_path', 'cache_path'),
+    'pdf-extract': ('target_file_path', 'output_path', 'timings_path', 'cache_path'),
+}
+
+# libraries the tools import lazily; workers import them up front
+WARM_MODULES = ('ffmpeg', 'numpy', 'icalendar', 'recurring_ical_events', 'openpyxl', 'PyPDF2')
+
+
+def _warm_up():
+    """Pool initializer: import every tool and library and detect ffmpeg."""
+    for module in [module for module, _, _ in TOOLS.values()] + list(WARM_MODULES):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass  # that tool's jobs will report it
+    try:
+        from mp4_lossless_compressor.ffmpeg_caps import capabilities
+        capabilities()
+    except EnvironmentError:
+        pass
+
+
+def _resolve_paths(tool, kwargs, cwd):
+    for name in PATH_ARGS.get(tool, ()):
+        value = kwargs.get(name)
+        if isinstance(value, str):
+            # join keeps a trailing slash, which pdf_extractor's prefixes rely on
+            kwargs[name] = os.path.join(cwd, os.path.expanduser(value))
+
+
+def _run_job(tool, args, cwd=None):
+    """Run one job in a worker, with relative paths in args taken
+    relative to cwd (default: the service's own directory).
+
+    returns -> dict: the tool's result, its printed lines and when it
+               started and finished (time.time(), for the queue/run split).
+    """
+    started = time.time()
+    if tool is None:
+        return {'result': os.getpid(), 'log': [], 'started': started, 'finished': time.time()}
+    module, function, defaults = TOOLS[tool]
+    kwargs = dict(defaults, **args)
+    if cwd:
+        _resolve_paths(tool, kwargs, cwd)
+    for name, convert in CONVERTERS.get(tool, {}).items():
+        if isinstance(kwargs.get(name), str):
+            kwargs[name] = convert(kwargs[name])
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = getattr(importlib.import_module(module), function)(**kwargs)
+    return {'result': result, 'log': output.getvalue().splitlines(),
+            'started': started, 'finished': time.time()}
+
+
+class Metrics:
+    """Job counters, queue depth and the latencies of the last
+    LATENCY_SAMPLES completed jobs per tool."""
+
+    def __init__(self, workers, limit):
+        self.workers = workers
+        self.limit = limit
+        self.started = time.time()
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue_depth())
+
+    def leave(self, tool, ok, queue_ms, run_ms, total_ms):
+        with self._lock:
+            self.in_flight -= 1
+            self.counts['completed' if ok else 'failed'] += 1
+            if not ok:
+                return  # latencies are those of completed jobs
+            samples = self.latencies.setdefault(tool, {
+                'queue_ms': deque(maxlen=LATENCY_SAMPLES),
+                'run_ms': deque(maxlen=LATENCY_SAMPLES),
+                'total_ms': deque(maxlen=LATENCY_SAMPLES),
+            })
+            samples['queue_ms'].append(queue_ms)
+            samples['run_ms'].append(run_ms)
+            samples['total_ms'].append(total_ms)
+
+    def _queue_depth(self):
+        return max(0, self.in_flight - self.workers)
+
+    @staticmethod
+    def _summary(values):
+        ordered = sorted(values)
+        return {
+            'count': len(ordered),
+            'mean': round(sum(ordered) / len(ordered), 2),
+            'p50': round(ordered[len(ordered) // 2], 2),
+            'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            'max': round(ordered[-1], 2),
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'workers': self.workers,
+                'queue_limit': self.limit,
+                'running': min(self.in_flight, self.workers),
+                'queue_depth': self._queue_depth(),
+                'max_queue_depth': self.max_queue_depth,
+                **self.counts,
+                'tools': {tool: {name: self._summary(values) for name, values in samples.items()}
+                          for tool, samples in self.latencies.items()},
+            }
+
+
+class WorkerService:
+    """A pool of warm worker processes behind a bounded queue."""
+
+    def __init__(self, workers=None, queue=QUEUE, wait=WAIT_SECONDS):
+        self.workers = workers or os.cpu_count() or 1
+        self.wait = wait
+        self.metrics = Metrics(self.workers, queue)
+        self._slots = threading.BoundedSemaphore(self.workers + queue)
+        self._pool_lock = threading.Lock()
+        self._pool = self._start_pool()
+
+    def _start_pool(self):
+        from concurrent.futures import ProcessPoolExecutor, wait
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+        # start (and warm) every worker now, before the first job and before
+        # the server's threads exist
+        wait([pool.submit(_run_job, None, {}) for _ in range(self.workers)])
+        return pool
+
+    def handle(self, request):
+        """Answer one request (a decoded JSON object)."""
+        received = time.time()
+        op = request.get('op')
+        if op == 'metrics':
+            return {'ok': True, 'result': self.metrics.snapshot()}
+        tool = request.get('tool')
+        if op != 'ping' and tool not in TOOLS:
+            return {'ok': False, 'error': f"unknown tool {tool!r}, expected one of {', '.join(TOOLS)}"}
+        args = request.get('args') or {}
+        if not isinstance(args, dict):
+            return {'ok': False, 'error': 'args must be an object of keyword arguments'}
+        cwd = request.get('cwd')
+        if cwd is not None and not (isinstance(cwd, str) and os.path.isabs(cwd)):
+            return {'ok': False, 'error': 'cwd must be an absolute path'}
+
+        self.metrics.count('submitted')
+        if not self._slots.acquire(timeout=self.wait):
+            self.metrics.count('rejected')
+            return {'ok': False, 'error': 'busy', 'queue_depth': self.metrics.snapshot()['queue_depth'],
+                    'total_ms': (time.time() - received) * 1000}
+        self.metrics.enter()
+        reply = {}
+        try:
+            job = self._submit(None if op == 'ping' else tool, args, cwd).result()
+            reply = {'ok': True, 'result': job['result'], 'log': job['log'],
+                     'queue_ms': (job['started'] - received) * 1000,
+                     'run_ms': (job['finished'] - job['started']) * 1000}
+        except Exception as e:
+            reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        finally:
+            self._slots.release()
+            reply['total_ms'] = (time.time() - received) * 1000
+            self.metrics.leave(op or tool, reply['ok'], reply.get('queue_ms'),
+                               reply.get('run_ms'), reply['total_ms'])
+        return reply
+
+    def _submit(self, tool, args, cwd):
+        from concurrent.futures.process import BrokenProcessPool
+        with self._pool_lock:
+            pool = self._pool
+        try:
+            return pool.submit(_run_job, tool, args, cwd)
+        except BrokenProcessPool:
+            # a worker died (killed, out of memory); replace the pool once
+            with self._pool_lock:
+                if self._pool is pool:
+                    print('A worker died, restarting the pool', file=sys.stderr)
+                    self._pool = self._start_pool()
+                pool = self._pool
+            return pool.submit(_run_job, tool, args, cwd)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('expected a JSON object')
+            except ValueError as e:
+                reply = {'ok': False, 'error': f'bad request: {e}'}
+            else:
+                reply = self.server.service.handle(request)
+                if 'id' in request:
+                    reply['id'] = request['id']
+            self.wfile.write(json.dumps(reply, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _claim_socket(path):
+    """Remove a socket file left behind by a service that is gone."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f'A service is already listening on {path}')
+
+
+def serve(socket_path=DEFAULT_SOCKET, workers=None, queue=QUEUE, wait=WAIT_SECONDS):
+    """Serve requests on socket_path until interrupted (Ctrl+C or SIGTERM)."""
+    import signal
+
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    _claim_socket(socket_path)
+    started = time.perf_counter()
+    service = WorkerService(workers, queue, wait)
+    server = _Server(socket_path, _Handler)
+    server.service = service
+    os.chmod(socket_path, 0o600)  # jobs read and write the user's files
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f'Listening on {socket_path}; workers: {service.workers} (warmed up in '
+          f'{time.perf_counter() - started:.1f}s), queue: {queue}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+        print('Service stopped')
+
+
+def request(message, socket_path=DEFAULT_SOCKET, timeout=None):
+    """Send one request to a running service and return its reply.
+
+    Relative paths in a job's args are resolved against this process's
+    working directory, unless the message names another "cwd".
+    """
+    if 'tool' in message and 'cwd' not in message:
+        message = dict(message, cwd=os.getcwd())
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as replies:
+            return json.loads(replies.readline())
+
+
+def _argument(item):
+    name, _, value = item.partition('=')
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value  # a plain string, e.g. a path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the utilities warm in a local service for many small jobs")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    actions = parser.add_subparsers(dest="action", required=True)
+    serve_parser = actions.add_parser("serve", help="Start the service")
+    serve_parser.add_argument("-j", "--workers", type=int, help="Warm worker processes (default: CPU count)")
+    serve_parser.add_argument("--queue", type=int, default=QUEUE,
+                              help=f"Jobs that may wait for a worker (default: {QUEUE})")
+    serve_parser.add_argument("--wait", type=float, default=WAIT_SECONDS,
+                              help=f"Seconds a request waits for room before it is turned away (default: {WAIT_SECONDS:g})")
+    submit_parser = actions.add_parser("submit", help="Run one job on the service and print the reply")
+    submit_parser.add_argument("tool", choices=list(TOOLS) + ["ping"])
+    submit_parser.add_argument("args", nargs="*", metavar="NAME=VALUE",
+                               help="Keyword arguments of the tool's function; values are JSON or plain strings")
+    actions.add_parser("metrics", help="Print the service's counters and latencies")
+    args = parser.parse_args()
+
+    if args.action == "serve":
+        serve(args.socket, args.workers, args.queue, args.wait)
+        return 0
+    if args.action == "metrics":
+        message = {"op": "metrics"}
+    elif args.tool == "ping":
+        message = {"op": "ping"}
+    else:
+        message = {"tool": args.tool, "args": dict(_argument(item) for item in args.args)}
+    reply = request(message, args.socket)
+    print(json.dumps(reply, indent=2, default=str))
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
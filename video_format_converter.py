@@ -1,31 +1,160 @@
+import argparse
 import os
 from pathlib import Path
 import subprocess
 
+from mp4_lossless_compressor.ffmpeg_caps import capabilities, require
+from mp4_lossless_compressor.probe_cache import ProbeError, probe
+from mp4_lossless_compressor.telemetry import console_progress, run_ffmpeg
+
+
+# Codecs each output container can hold as-is; streams in other codecs are
+# re-encoded. None means the container takes anything.
+CONTAINER_CODECS = {
+    "mp4": {
+        "video": {"h264", "hevc", "av1", "vp9", "mpeg4"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "alac", "opus", "flac"},
+    },
+    "mov": {
+        "video": {"h264", "hevc", "prores", "mjpeg", "mpeg4"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "alac", "pcm_s16le", "pcm_s24le"},
+    },
+    "mkv": {"video": None, "audio": None},
+    "webm": {
+        "video": {"vp8", "vp9", "av1"},
+        "audio": {"opus", "vorbis"},
+    },
+    "avi": {
+        "video": {"h264", "mpeg4", "mjpeg", "msmpeg4v3"},
+        "audio": {"aac", "mp3", "ac3", "pcm_s16le"},
+    },
+    "ts": {
+        "video": {"h264", "hevc", "mpeg2video"},
+        "audio": {"aac", "mp3", "ac3", "eac3"},
+    },
+}
+CONTAINER_CODECS["m4v"] = CONTAINER_CODECS["mp4"]
+
+# Encoders used when a stream has to be re-encoded. What they write must be
+# in the container's own list above, or converting that container to itself
+# re-encodes a file into the codecs it already has.
+ENCODERS = {"webm": ("libvpx-vp9", "libopus")}
+DEFAULT_ENCODERS = ("libx264", "aac")
+
+# ffmpeg muxer picked for each output extension, where the names differ
+MUXERS = {"mkv": "matroska", "ts": "mpegts", "m4v": "ipod"}
+
+# Bitstream filters a copied video stream needs for the container: AVI
+# takes H.264/HEVC only in Annex B form, not as MP4/MKV store it
+BITSTREAM_FILTERS = {"avi": {"h264": "h264_mp4toannexb", "hevc": "hevc_mp4toannexb"}}
+
+REMUX, AUDIO_TRANSCODE, REENCODE = "remux", "audio-transcode", "re-encode"
+
+
+def plan_conversion(probe_info, output_format):
+    """Decide per stream whether it can be copied into output_format.
+
+    Looks at the streams ffmpeg would pick by default: the first video
+    stream (cover art aside) and the first audio stream.
+
+    returns -> (str, dict): the cheapest valid path (REMUX: copy
+               everything, AUDIO_TRANSCODE: copy video only, REENCODE) and
+               {"video": bool, "audio": bool} telling which can be copied.
+    """
+    allowed = CONTAINER_CODECS.get(output_format.lower())
+    copy = {}
+    for kind in ("video", "audio"):
+        stream = _default_stream(probe_info, kind)
+        if stream is None:
+            continue
+        codecs = allowed[kind] if allowed else set()
+        copy[kind] = codecs is None or stream.get("codec_name") in codecs
+
+    if not copy.get("video", True):
+        return REENCODE, copy
+    if not copy.get("audio", True):
+        return AUDIO_TRANSCODE, copy
+    return REMUX, copy
+
+
+def _default_stream(probe_info, kind):
+    return next((s for s in probe_info["streams"]
+                 if s.get("codec_type") == kind
+                 and not s.get("disposition", {}).get("attached_pic")), None)
+
+
+def _check_encoders(output_format, copy):
+    """Fail before starting if ffmpeg lacks an encoder or muxer the conversion needs."""
+    video_encoder, audio_encoder = ENCODERS.get(output_format.lower(), DEFAULT_ENCODERS)
+    encoders = [encoder for kind, encoder in (("video", video_encoder), ("audio", audio_encoder))
+                if not copy.get(kind)]
+    muxers = [MUXERS.get(output_format.lower(), output_format.lower())] \
+        if output_format.lower() in CONTAINER_CODECS else []
+    require(encoders=encoders, muxers=muxers)
+
+
+def _conversion_command(input_file, output_file, output_format, copy, threads, video_codec=None):
+    video_encoder, audio_encoder = ENCODERS.get(output_format.lower(), DEFAULT_ENCODERS)
+    command = ["ffmpeg", "-i", str(input_file)]
+    if copy.get("video"):
+        command += ["-c:v", "copy"]
+        bitstream_filter = BITSTREAM_FILTERS.get(output_format.lower(), {}).get(video_codec)
+        if bitstream_filter:
+            command += ["-bsf:v", bitstream_filter]
+    else:
+        command += [
+            "-c:v", video_encoder,     # video codec (H.264 unless the container needs another)
+            "-preset", "medium",       # encoding speed/quality balance
+            "-crf", "23",              # "Constant Rate Factor" for quality
+        ]
+        if video_encoder == "libvpx-vp9":
+            command += ["-b:v", "0"]   # makes -crf constant quality for VP9
+    if copy.get("audio"):
+        command += ["-c:a", "copy"]
+    else:
+        command += [
+            "-c:a", audio_encoder,     # audio codec (AAC unless the container needs another)
+            "-b:a", "192k",            # audio bitrate
+        ]
+    if threads:
+        command += ["-threads", str(threads)]
+    command += [
+        "-y",                      # output overwrite
+        str(output_file)           # output file
+    ]
+    return command
+
 
 def check_ffmpeg_installed():
-    """Check if FFmpeg is installed and accessible."""
-    try:
-        subprocess.run(["ffmpeg", "-version"], 
-                       stdout=subprocess.PIPE, 
-                       stderr=subprocess.PIPE, 
-                       check=True,
-                       shell=True)
-    except (FileNotFoundError, subprocess.CalledProcessError):
-        raise EnvironmentError(
-            "FFmpeg is not installed or not found in the system PATH. "
-            "Please install FFmpeg and ensure it's accessible. "
-            "Download from: https://ffmpeg.org/download.html"
-        )
+    """Check if FFmpeg is installed and accessible.
+
+    Detection runs once per process and is cached on disk (see ffmpeg_caps).
+
+    returns -> ffmpeg_caps.Capabilities: version, encoders, muxers, filters.
+    """
+    return capabilities()
 
 
-def convert_video(input_file, output_format="mp4", output_file=None):
+def convert_video(input_file, output_format="mp4", output_file=None, threads=None,
+                  on_progress=None, progress_log=None, force_reencode=False):
     """Convert a video file to a specified format (default: mp4).
 
+    Streams the target container can hold as they are are copied instead of
+    re-encoded (see plan_conversion), so e.g. H.264/AAC from MKV to MP4 is a
+    quick remux. The path taken is printed.
+
     :param: input_file (str): Path to the input video file.
     :param: output_format (str): Desired output format (default: "mp4").
     :param: output_file (str): Path to the output file (optional).
                                default: input file name.
+    :param: threads (int): CPU threads ffmpeg may use (optional).
+                           default: all of them.
+    :param: on_progress (callable): Called with a telemetry.Progress (fps,
+                                    speed, bitrate, out_time, ETA) about
+                                    twice a second (optional).
+    :param: progress_log (str): Append every Progress to this file as a
+                                JSON line (optional).
+    :param: force_reencode (bool): Always re-encode (H.264 CRF 23 + AAC).
 
     returns -> str: Path to the converted video file.
     """
@@ -39,6 +168,14 @@ def convert_video(input_file, output_format="mp4", output_file=None):
             f"Current working directory: {os.getcwd()}"
         )
 
+    # fail fast on files ffmpeg can't read; the result is cached for later calls
+    try:
+        info = probe(str(input_file))
+    except ProbeError as e:
+        raise RuntimeError(
+            f"Input file '{input_file}' is not a readable video:\n{e.stderr}"
+        ) from e
+
     input_ext = input_file.suffix[1:].lower()
 
     # cannot convert to the same format
@@ -52,26 +189,26 @@ def convert_video(input_file, output_format="mp4", output_file=None):
         output_file = Path(os.path.expanduser(output_file)).resolve()
     output_file.parent.mkdir(parents=True, exist_ok=True)
 
-    command = [
-        "ffmpeg",
-        "-i", str(input_file),     # input file
-        "-c:v", "libx264",         # video codec (H.264)
-        "-preset", "medium",       # encoding speed/quality balance
-        "-crf", "23",              # "Constant Rate Factor" for quality
-        "-c:a", "aac",             # audio codec (AAC)
-        "-b:a", "192k",            # audio bitrate
-        "-y",                      # output overwrite
-        str(output_file)           # output file
-    ]
+    duration = float(info["format"].get("duration") or 0) or None
+    path, copy = (REENCODE, {}) if force_reencode else plan_conversion(info, output_format)
+    streams = ", ".join(f"{kind} {'copied' if copied else 're-encoded'}" for kind, copied in copy.items())
+    print(f"Conversion path: {path}" + (f" ({streams})" if streams else ""))
+    _check_encoders(output_format, copy)
+    video_stream = _default_stream(info, "video")
+    command = _conversion_command(input_file, output_file, output_format, copy, threads,
+                                  video_stream and video_stream.get("codec_name"))
 
     try:
-        subprocess.run(
-            command, 
-            check=True, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            text=True
-        )
+        try:
+            run_ffmpeg(command, duration=duration, on_progress=on_progress, log_path=progress_log)
+        except subprocess.CalledProcessError:
+            if path == REENCODE:
+                raise
+            # some streams don't survive a copy (odd timestamps, codec tags); encode them after all
+            print("Copying streams failed, re-encoding instead.")
+            _check_encoders(output_format, {})
+            command = _conversion_command(input_file, output_file, output_format, {}, threads)
+            run_ffmpeg(command, duration=duration, on_progress=on_progress, log_path=progress_log)
         return str(output_file)
     
     except subprocess.CalledProcessError as e:
@@ -90,15 +227,28 @@ Error during video conversion:
         raise RuntimeError(f"Unexpected error during conversion: {e}") from e
 
 def main():
-    try:
-        input_path = input("Input video: ").strip()
-        output_format = input("Desired output format (default: mp4): ").strip() or "mp4"
-        output_path = input("Desired output path (or press Enter to use default): ").strip()
+    parser = argparse.ArgumentParser(description="Convert a video to another container/format")
+    parser.add_argument("input", help="Path to the input video file")
+    parser.add_argument("-f", "--format", default="mp4",
+                        help="Output format, e.g. mp4, mkv, webm (default: mp4)")
+    parser.add_argument("-o", "--output",
+                        help="Path for the output file (default: the input path with the new extension)")
+    parser.add_argument("--threads", type=int, help="CPU threads ffmpeg may use (default: all)")
+    parser.add_argument("--progress-log", metavar="JSONL",
+                        help="Append conversion progress (fps, speed, bitrate, ETA) to this file as JSON lines")
+    parser.add_argument("--force-reencode", action="store_true",
+                        help="Re-encode (H.264 CRF 23 + AAC) even if the streams could be copied")
+    args = parser.parse_args()
 
+    try:
         result_file = convert_video(
-            input_path, 
-            output_format, 
-            output_path or None
+            args.input,
+            args.format,
+            args.output,
+            threads=args.threads,
+            on_progress=console_progress,
+            progress_log=args.progress_log,
+            force_reencode=args.force_reencode
         )
         print(f"Converted video saved at: {result_file}")
 
@@ -1,23 +1,644 @@
-import zipfile
+import argparse
+import collections
+import contextlib
+import hashlib
+import json
 import os
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Members larger than this are deflated in the writing process with
+# zipfile's own chunked writer instead of being shipped to a worker,
+# so a single huge file never has to sit in memory as one blob.
+PARALLEL_MEMBER_LIMIT = 64 * 1024 * 1024
+# Bytes of input handed to workers but not yet written out. Each of those
+# members sits in memory (read, then deflated) until its turn comes, so
+# this, not the worker count, bounds the parallel mode's memory.
+PARALLEL_WINDOW_BYTES = 256 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 1
+
+# Formats whose payload is already compressed; deflating them again costs
+# CPU for next to no size gain.
+COMPRESSED_EXTENSIONS = {
+    '.7z', '.aac', '.avi', '.br', '.bz2', '.docx', '.flac', '.gif', '.gz', '.heic',
+    '.jar', '.jpeg', '.jpg', '.lz4', '.m4a', '.m4v', '.mkv', '.mov', '.mp3', '.mp4',
+    '.odt', '.ogg', '.opus', '.png', '.pptx', '.rar', '.tgz', '.webm', '.webp',
+    '.xlsx', '.xz', '.zip', '.zst',
+}
+COMPRESSED_MAGIC = (
+    b'PK\x03\x04',         # zip and zip based office formats
+    b'\x1f\x8b',           # gzip
+    b'BZh',                # bzip2
+    b'\xfd7zXZ\x00',       # xz
+    b"7z\xbc\xaf'\x1c",    # 7-zip
+    b'Rar!',               # rar
+    b'(\xb5/\xfd',         # zstandard
+    b'\xff\xd8\xff',        # jpeg
+    b'\x89PNG',            # png
+    b'GIF8',               # gif
+    b'\x1aE\xdf\xa3',       # matroska / webm
+    b'OggS',               # ogg
+    b'fLaC',               # flac
+    b'ID3',                # mp3
+)
+
+STORED = 'store'
+
+
+def _collect_files(directory):
+    """Return sorted (file_path, arcname) pairs for every file under directory."""
+    members = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            members.append((file_path, os.path.relpath(file_path, directory)))
+    return members
+
+
+Decision = collections.namedtuple(
+    'Decision', 'rule compress_type compresslevel baseline_ratio baseline_seconds_per_byte')
+
+
+def _deflater(compresslevel):
+    level = zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel
+    return zlib.compressobj(level, zlib.DEFLATED, -15)
+
+
+class CompressionPolicy:
+    """
+    Chooses STORED or DEFLATED, and the deflate level, for each member.
+
+    Rules are checked in order: user overrides by extension, known
+    compressed formats (extension or magic bytes), then a trial deflate of
+    the first sample_size bytes. The trial is run at the baseline level for
+    every file so the report can estimate what each rule saved compared to
+    deflating everything at that level.
+
+    :param rules: Extension overrides, e.g. {'.log': 9, '.bin': 'store'}.
+    :param compresslevel: Baseline deflate level, zlib's default when None.
+    :param adaptive: When False every file is deflated at compresslevel.
+    :param store_ratio: Trial ratio above which a file is stored.
+    :param fast_ratio: Trial ratio above which a file is deflated at level 1.
+    """
+
+    def __init__(self, rules=None, compresslevel=None, adaptive=True,
+                 sample_size=64 * 1024, store_ratio=0.9, fast_ratio=0.75):
+        self.rules = {ext.lower(): choice for ext, choice in (rules or {}).items()}
+        self.compresslevel = compresslevel
+        self.adaptive = adaptive
+        self.sample_size = sample_size
+        self.store_ratio = store_ratio
+        self.fast_ratio = fast_ratio
+
+    def choose(self, file_path, head):
+        """
+        Decides how to compress file_path from its first block.
+
+        returns -> tuple: (Decision, reuse) where reuse is a (compressor,
+                   output) pair for the baseline deflater already fed with
+                   head when the decision is to deflate at the baseline
+                   level, else None.
+        """
+        compressor = _deflater(self.compresslevel)
+        started = time.perf_counter()
+        trial = compressor.compress(head)
+        trial_size = len(trial) + len(compressor.copy().flush())
+        trial_seconds = time.perf_counter() - started
+        ratio = trial_size / len(head) if head else 1.0
+        per_byte = trial_seconds / len(head) if head else 0.0
+
+        def decide(rule, choice):
+            if choice == STORED:
+                return Decision(rule, zipfile.ZIP_STORED, None, ratio, per_byte), None
+            reuse = choice == self.compresslevel
+            return (Decision(rule, zipfile.ZIP_DEFLATED, choice, ratio, per_byte),
+                    (compressor, trial) if reuse else None)
+
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension in self.rules:
+            return decide('override', self.rules[extension])
+        if not self.adaptive:
+            return decide('default', self.compresslevel)
+        if extension in COMPRESSED_EXTENSIONS or head.startswith(COMPRESSED_MAGIC) \
+                or head[4:8] == b'ftyp':
+            return decide('compressed-format', STORED)
+        if len(head) >= 512 and ratio > self.store_ratio:
+            return decide('incompressible', STORED)
+        if len(head) >= 512 and ratio > self.fast_ratio:
+            return decide('low-gain', 1)
+        return decide('default', self.compresslevel)
+
+
+def _compress_file(file_path, policy):
+    """Compress a whole file in a worker process according to policy.
+
+    returns -> tuple: (decision, crc, file_size, payload, sha256, seconds)
+               where payload is the member data exactly as it goes into the
+               archive (a raw deflate stream, or the file bytes when stored)
+               and seconds is the time spent deflating it.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    seconds = 0.0
+    with open(file_path, 'rb') as f:
+        block = f.read(policy.sample_size)
+        decision, reuse = policy.choose(file_path, block)
+        compressor = None
+        pending = block
+        if reuse is not None:
+            compressor, head_output = reuse
+            chunks.append(head_output)
+            seconds = decision.baseline_seconds_per_byte * len(block)
+            pending = b''
+        elif decision.compress_type == zipfile.ZIP_DEFLATED:
+            compressor = _deflater(decision.compresslevel)
+        crc = zlib.crc32(block)
+        file_size = len(block)
+        digest.update(block)
+        while True:
+            if pending and compressor is None:
+                chunks.append(pending)
+            elif pending:
+                started = time.perf_counter()
+                chunks.append(compressor.compress(pending))
+                seconds += time.perf_counter() - started
+            block = f.read(READ_CHUNK_SIZE)
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+            digest.update(block)
+            file_size += len(block)
+            pending = block
+    if compressor is not None:
+        started = time.perf_counter()
+        chunks.append(compressor.flush())
+        seconds += time.perf_counter() - started
+    return decision, crc, file_size, b''.join(chunks), digest.hexdigest(), seconds
+
+
+def _hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(READ_CHUNK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_raw_member(zipf, zinfo, data):
+    """Append an already-compressed member to an archive opened for writing.
+
+    zinfo must carry the final CRC, file_size, compress_size and
+    compress_type; data is the compressed payload, either as bytes or as
+    an iterable of byte chunks.
+    """
+    if isinstance(data, bytes):
+        data = (data,)
+    zinfo.header_offset = zipf.fp.tell()
+    zipf._writecheck(zinfo)
+    zipf._didModify = True
+    zipf.fp.write(zinfo.FileHeader())
+    for chunk in data:
+        zipf.fp.write(chunk)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+
+
+def _read_raw_member(source, zinfo):
+    """Yield the compressed bytes of a member of source without inflating them."""
+    source.fp.seek(zinfo.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.fp.seek(zinfo.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    remaining = zinfo.compress_size
+    while remaining:
+        chunk = source.fp.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {zinfo.filename!r}")
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _copy_raw_member(zipf, source, zinfo, date_time=None):
+    """Copy a member from source into zipf as raw compressed bytes."""
+    copied = zipfile.ZipInfo(zinfo.filename, date_time or zinfo.date_time)
+    copied.compress_type = zinfo.compress_type
+    copied.flag_bits = zinfo.flag_bits & ~0x08  # sizes go in the local header
+    copied.external_attr = zinfo.external_attr
+    copied.create_system = zinfo.create_system
+    copied.CRC = zinfo.CRC
+    copied.file_size = zinfo.file_size
+    copied.compress_size = zinfo.compress_size
+    _write_raw_member(zipf, copied, _read_raw_member(source, zinfo))
+
+
+def _write_file(zipf, file_path, arcname, policy):
+    """Write one file through zipfile in fixed-size chunks.
+
+    seconds covers only zipfile's write calls, which compress (and write out
+    what that produces), not reading and hashing the file, so it compares
+    with _compress_file's deflate time.
+
+    returns -> tuple: (decision, sha256, seconds)
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    digest = hashlib.sha256()
+    seconds = 0.0
+    with open(file_path, 'rb') as src:
+        block = src.read(policy.sample_size)
+        decision, _ = policy.choose(file_path, block)
+        zinfo.compress_type = decision.compress_type
+        zinfo._compresslevel = decision.compresslevel
+        with zipf.open(zinfo, 'w') as dest:
+            while block:
+                digest.update(block)
+                started = time.perf_counter()
+                dest.write(block)
+                seconds += time.perf_counter() - started
+                block = src.read(READ_CHUNK_SIZE)
+            # closing flushes the compressor
+            started = time.perf_counter()
+        seconds += time.perf_counter() - started
+    return decision, digest.hexdigest(), seconds
+
+
+def load_manifest(zip_file):
+    """Load the manifest stored next to zip_file, or an empty one."""
+    try:
+        with open(zip_file + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('members', {})
+
+
+def _save_manifest(zip_file, members):
+    manifest_path = zip_file + MANIFEST_SUFFIX
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'members': members}, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def _plan_members(directory, manifest, source):
+    """Pair every file with the previous archive member it can be copied from.
+
+    A file is unchanged when its size and mtime match the manifest, or when
+    only the mtime moved but the content hash is still the same.
+
+    returns -> list: (file_path, arcname, stat, previous_zinfo, sha256) tuples;
+               previous_zinfo and sha256 are None for files to compress.
+    """
+    plan = []
+    for file_path, arcname in _collect_files(directory):
+        stat = os.stat(file_path)
+        entry = manifest.get(arcname)
+        previous = None
+        digest = None
+        if entry and source is not None and entry['size'] == stat.st_size:
+            zinfo = source.NameToInfo.get(arcname)
+            if zinfo is not None:
+                if entry['mtime_ns'] == stat.st_mtime_ns:
+                    previous, digest = zinfo, entry['sha256']
+                elif _hash_file(file_path) == entry['sha256']:
+                    previous, digest = zinfo, entry['sha256']
+        plan.append((file_path, arcname, stat, previous, digest))
+    return plan
+
 
-def zip_directory(directory, zip_file):
+class _ProgressWriter:
+    """Counts bytes written to a sink and reports throughput every interval seconds.
+
+    Everything but write() is forwarded to the wrapped stream, so zipfile
+    still sees whether the sink can seek.
+    """
+
+    def __init__(self, stream, progress, interval=1.0):
+        self._stream = stream
+        self._progress = progress
+        self._interval = interval
+        self._started = self._last = time.perf_counter()
+        self.bytes_written = 0
+
+    def write(self, data):
+        written = self._stream.write(data)
+        self.bytes_written += len(data)
+        now = time.perf_counter()
+        if now - self._last >= self._interval:
+            self._last = now
+            self._progress(self.bytes_written, now - self._started)
+        return written
+
+    def finish(self):
+        self._progress(self.bytes_written, time.perf_counter() - self._started)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def print_progress(bytes_written, seconds):
+    """Default progress callback: MB written and MB/s on stderr."""
+    rate = bytes_written / 1048576 / seconds if seconds else 0.0
+    print(f"\r{bytes_written / 1048576:.1f} MB written, {rate:.1f} MB/s",
+          end='', file=sys.stderr, flush=True)
+
+
+def _new_report():
+    return collections.defaultdict(lambda: {
+        'files': 0, 'input_bytes': 0, 'output_bytes': 0, 'seconds': 0.0,
+        'saved_bytes': 0, 'saved_seconds': 0.0,
+    })
+
+
+def _account(report, decision, file_size, output_size, seconds):
+    """Add one member to the per-rule report.
+
+    Savings are measured against deflating the file at the baseline level,
+    extrapolated from the policy's trial of its first block.
+    """
+    entry = report[decision.rule]
+    entry['files'] += 1
+    entry['input_bytes'] += file_size
+    entry['output_bytes'] += output_size
+    entry['seconds'] += seconds
+    entry['saved_bytes'] += int(file_size * decision.baseline_ratio) - output_size
+    entry['saved_seconds'] += file_size * decision.baseline_seconds_per_byte - seconds
+
+
+def _write_members(zipf, plan, source, policy, workers=None, streaming=False):
+    """Write planned members in order, compressing new ones serially or in a pool.
+
+    Only a bounded window of results is kept in flight: at most
+    PARALLEL_WINDOW_BYTES of input (and workers * 4 members), so memory
+    grows neither with the size of the tree nor with the worker count. With streaming, serial runs push every
+    member through zipfile in READ_CHUNK_SIZE pieces.
+
+    returns -> tuple: (dict of arcname -> sha256, per-rule report)
+    """
+    digests = {}
+    report = _new_report()
+    pending = collections.deque()
+    in_flight = 0
+
+    def write_next():
+        nonlocal in_flight
+        file_path, arcname, stat, previous, digest, future = pending.popleft()
+        if future is not None:
+            in_flight -= stat.st_size
+        if previous is not None:
+            _copy_raw_member(zipf, source, previous, time.localtime(stat.st_mtime)[:6])
+            entry = report['unchanged']
+            entry['files'] += 1
+            entry['input_bytes'] += previous.file_size
+            entry['output_bytes'] += previous.compress_size
+        elif future is None and (streaming or stat.st_size > PARALLEL_MEMBER_LIMIT):
+            decision, digest, seconds = _write_file(zipf, file_path, arcname, policy)
+            zinfo = zipf.NameToInfo[arcname]
+            _account(report, decision, zinfo.file_size, zinfo.compress_size, seconds)
+        else:
+            result = future.result() if future else _compress_file(file_path, policy)
+            decision, crc, file_size, data, digest, seconds = result
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            zinfo.compress_type = decision.compress_type
+            zinfo.CRC = crc
+            zinfo.file_size = file_size
+            zinfo.compress_size = len(data)
+            _write_raw_member(zipf, zinfo, data)
+            _account(report, decision, file_size, len(data), seconds)
+        digests[arcname] = digest
+
+    if not workers or workers < 2:
+        for member in plan:
+            pending.append(member + (None,))
+            write_next()
+        return digests, dict(report)
+
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for member in plan:
+            file_path, _, stat, previous, _ = member
+            future = None
+            if previous is None and stat.st_size <= PARALLEL_MEMBER_LIMIT:
+                while pending and in_flight + stat.st_size > PARALLEL_WINDOW_BYTES:
+                    write_next()
+                future = pool.submit(_compress_file, file_path, policy)
+                in_flight += stat.st_size
+            pending.append(member + (future,))
+            if len(pending) > window:
+                write_next()
+        while pending:
+            write_next()
+    return digests, dict(report)
+
+
+def zip_directory(directory, zip_file, workers=None, compresslevel=None, incremental=False,
+                  policy=None, progress=None):
     """
     Compresses the specified directory into a zip file.
 
     :param directory: Path to the directory to be compressed.
-    :param zip_file: Path to the output zip file.
+    :param zip_file: Path to the output zip file, or a writable binary stream.
+                     Streams need not be seekable (pipes, sockets, stdout);
+                     members are then written with data descriptors and
+                     input files are read in fixed-size chunks.
+    :param workers: Number of processes deflating members in parallel.
+                    None or 1 compresses serially; 0 uses every CPU.
+    :param compresslevel: Deflate level (0-9), zlib's default when None.
+                          Ignored when an explicit policy is given.
+    :param incremental: Reuse unchanged members of an existing zip_file.
+                        A manifest of (path, size, mtime, sha256) is kept in
+                        `zip_file + '.manifest.json'`; members whose files did
+                        not change are copied as raw compressed bytes and only
+                        new or modified files are deflated.
+    :param policy: CompressionPolicy choosing STORED/DEFLATED and the level
+                   per file. Defaults to CompressionPolicy(compresslevel=...).
+    :param progress: Optional callable(bytes_written, seconds) invoked about
+                     once a second while the archive is written, e.g.
+                     print_progress.
+
+    returns -> dict: member counts, elapsed seconds and, under 'rules', the
+               files, bytes and seconds each policy rule saved.
     """
-    with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.relpath(file_path, directory))
+    started = time.perf_counter()
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if policy is None:
+        policy = CompressionPolicy(compresslevel=compresslevel)
+    streaming = not isinstance(zip_file, (str, os.PathLike))
+    if streaming and incremental:
+        raise ValueError("incremental mode needs zip_file to be a path, not a stream")
+    if not streaming:
+        zip_file = os.fspath(zip_file)
+
+    manifest = load_manifest(zip_file) if incremental else {}
+    source = None
+    if manifest and os.path.isfile(zip_file):
+        try:
+            source = zipfile.ZipFile(zip_file, 'r')
+        except zipfile.BadZipFile:
+            manifest = {}
+
+    # incremental runs read the previous archive while writing the new one
+    output = zip_file + '.partial' if incremental else zip_file
+
+    sink = None
+    try:
+        plan = _plan_members(directory, manifest, source)
+        if progress is not None:
+            sink = _ProgressWriter(output if streaming else open(output, 'wb'), progress)
+        with zipfile.ZipFile(sink or output, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            digests, rules = _write_members(zipf, plan, source, policy, workers, streaming)
+        if sink is not None:
+            sink.finish()
+    except BaseException:
+        if output != zip_file:
+            # the failure may have come before the partial file was created
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(output)
+        raise
+    finally:
+        if sink is not None and not streaming:
+            sink.close()
+        if source is not None:
+            source.close()
+
+    if incremental:
+        os.replace(output, zip_file)
+        _save_manifest(zip_file, {
+            arcname: {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digests[arcname]}
+            for _, arcname, stat, _, _ in plan
+        })
+
+    copied = sum(1 for member in plan if member[3] is not None)
+    seconds = time.perf_counter() - started
+    return {
+        'members': len(plan),
+        'copied': copied,
+        'compressed': len(plan) - copied,
+        'seconds': seconds,
+        'bytes_written': sink.bytes_written if sink is not None else None,
+        'rules': rules,
+    }
+
+
+def print_report(report, file=None):
+    """Print the per-rule section of a zip_directory report."""
+    print(f"{'rule':<18}{'files':>8}{'input MB':>11}{'output MB':>11}"
+          f"{'seconds':>9}{'saved MB':>10}{'saved s':>9}", file=file)
+    for rule, entry in sorted(report['rules'].items()):
+        print(f"{rule:<18}{entry['files']:>8}"
+              f"{entry['input_bytes'] / 1048576:>11.1f}{entry['output_bytes'] / 1048576:>11.1f}"
+              f"{entry['seconds']:>9.2f}{entry['saved_bytes'] / 1048576:>10.1f}"
+              f"{entry['saved_seconds']:>9.2f}", file=file)
+
+
+def _parse_rule(value):
+    """Parse a CLI rule such as '.log=9' or '.bin=store'."""
+    extension, _, choice = value.partition('=')
+    if not extension.startswith('.') or not choice:
+        raise argparse.ArgumentTypeError(f"expected .ext=store or .ext=0-9, got {value!r}")
+    if choice == STORED:
+        return extension, STORED
+    if choice.isdigit() and 0 <= int(choice) <= 9:
+        return extension, int(choice)
+    raise argparse.ArgumentTypeError(f"expected .ext=store or .ext=0-9, got {value!r}")
 
-if __name__ == "__main__":
-    directory_to_zip = r'<abolute path to file goes here>'
-    output_zip_file = r'<absolute path including file name goes here'
 
-    zip_directory(directory_to_zip, output_zip_file)
-    print(f"Directory '{directory_to_zip}' zipped successfully to '{output_zip_file}'.")
+def compare_throughput(directory, workers=0, compresslevel=None):
+    """
+    Zips directory serially and in parallel and reports the throughput of each.
+
+    :param directory: Path to the directory to be compressed.
+    :param workers: Worker count for the parallel run (0 uses every CPU).
+    :param compresslevel: Deflate level passed to both runs.
+
+    returns -> dict: seconds, MB/s and archive size for each mode.
+    """
+    input_bytes = sum(os.path.getsize(path) for path, _ in _collect_files(directory))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, mode_workers in (('serial', None), ('parallel', workers)):
+            output = os.path.join(tmp, f'{mode}.zip')
+            started = time.perf_counter()
+            zip_directory(directory, output, workers=mode_workers, compresslevel=compresslevel)
+            elapsed = time.perf_counter() - started
+            results[mode] = {
+                'seconds': elapsed,
+                'mb_per_sec': input_bytes / (1024 * 1024) / elapsed if elapsed else float('inf'),
+                'archive_bytes': os.path.getsize(output),
+            }
+    results['speedup'] = results['serial']['seconds'] / results['parallel']['seconds']
+
+    for mode in ('serial', 'parallel'):
+        print(f"{mode:>8}: {results[mode]['seconds']:.2f}s, "
+              f"{results[mode]['mb_per_sec']:.1f} MB/s, "
+              f"{results[mode]['archive_bytes']} bytes")
+    print(f" speedup: {results['speedup']:.2f}x")
+    return results
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Zip a directory")
+    parser.add_argument("directory", help="Path to the directory to be compressed")
+    parser.add_argument("zip_file", nargs="?",
+                        help="Path to the output zip file, or '-' to stream to stdout")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="Parallel compression processes (default: serial; all CPUs with --compare; "
+                             "0 = all CPUs)")
+    parser.add_argument("-l", "--level", type=int, choices=range(10), metavar="0-9",
+                        help="Deflate compression level")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="Only recompress files changed since the last run of this archive")
+    parser.add_argument("-r", "--rule", type=_parse_rule, action="append", default=[],
+                        metavar=".EXT=store|0-9",
+                        help="Override the compression policy for an extension (repeatable)")
+    parser.add_argument("--no-policy", action="store_true",
+                        help="Deflate every file at the same level instead of choosing per file")
+    parser.add_argument("--report", action="store_true",
+                        help="Print bytes and seconds saved per compression rule")
+    parser.add_argument("--progress", action="store_true",
+                        help="Show bytes written and MB/s on stderr while zipping")
+    parser.add_argument("--compare", action="store_true",
+                        help="Benchmark serial vs parallel compression instead of writing zip_file")
+    args = parser.parse_args()
+
+    if args.compare:
+        # parallel side of the comparison: every CPU unless -j says otherwise
+        compare_throughput(args.directory, 0 if args.workers is None else args.workers, args.level)
+        return 0
+    if not args.zip_file:
+        parser.error("zip_file is required unless --compare is given")
+
+    policy = CompressionPolicy(rules=dict(args.rule), compresslevel=args.level,
+                               adaptive=not args.no_policy)
+    to_stdout = args.zip_file == '-'
+    # keep stdout clean for the archive bytes when streaming
+    log = sys.stderr if to_stdout else sys.stdout
+    report = zip_directory(args.directory, sys.stdout.buffer if to_stdout else args.zip_file,
+                           workers=args.workers, incremental=args.incremental, policy=policy,
+                           progress=print_progress if args.progress else None)
+    if args.progress:
+        print(file=sys.stderr)
+    print(f"Directory '{args.directory}' zipped successfully to '{args.zip_file}'.", file=log)
+    if args.incremental:
+        print(f"{report['compressed']} compressed, {report['copied']} copied unchanged "
+              f"in {report['seconds']:.2f}s.", file=log)
+    if args.report:
+        print_report(report, file=log)
+    return 0
+
+
+if __name__ == "__main__":
+    main()